@@ -2,7 +2,18 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-import unicodedata
+import os
+from cache_colunar import hash_conteudo
+from cache_resultados import CacheResultados, normalizar_filtros
+from registro_dados import RegistroDados, id_conjunto
+from cubo import fatiar, competencias_disponiveis
+from tabela_detalhada import TAMANHOS_PAGINA, filtrar_ordenar, recortar_pagina, total_paginas
+from motor import carregar_dados, listar_resultados, consolidar_periodo, calcular_timeline, calcular_top_procedimentos
+from periodos import rotulo_competencia
+from ingestao import WORKERS_PADRAO, USAR_PROCESSOS_PADRAO
+from instrumentacao import Rastreador, admin_ativo
+from numeros_br import formatar_brl
+from exportacao import FORMATOS, Exportador, chave_exportacao, tabelas_exportacao
 
 # --- CONFIGURAÇÃO DA PÁGINA (WIDE & INITIAL SIDEBAR) ---
 st.set_page_config(
@@ -12,6 +23,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Medições deste rerun (painel de administração e log estruturado)
+rastreador = Rastreador()
+
 # --- ESTILO CSS AVANÇADO (MODERNO & CLEAN) ---
 st.markdown("""
 <style>
@@ -117,19 +131,6 @@ st.markdown("""
         margin-top: 1.5rem;
     }
     
-    /* Ajuste para que a coluna de barra de progresso em HTML fique melhor */
-    div[data-testid="stHorizontalBlock"] > div:nth-child(5) {
-        width: 100% !important;
-        min-width: 150px; /* Ajuste para ter espaço para a barra */
-    }
-    .stMarkdown table {
-        width: 100% !important;
-        table-layout: fixed; /* Ajuda a distribuir colunas */
-    }
-    .stMarkdown td, .stMarkdown th {
-        word-wrap: break-word; /* Previne estouro de texto */
-        white-space: normal;
-    }
 
 </style>
 """, unsafe_allow_html=True)
@@ -144,274 +145,203 @@ def get_color_hex(execucao_perc):
     else: 
         return '#e74c3c'  # Vermelho
 
-def style_progress_bar_html(val):
-    """Gera o HTML para a barra de progresso colorida."""
-    
-    # 1. O preenchimento visual é limitado a 100%
-    val_clamped_visual = max(0, min(100, val)) 
-    
-    # 2. A cor é baseada no valor real
-    color = get_color_hex(val)
-    
-    return f"""
-    <div style="background-color: #f0f2f6; border-radius: 4px; overflow: hidden; height: 1.5rem; width: 100%;">
-        <div style="
-            background-color: {color}; 
-            width: {val_clamped_visual}%; /* LIMITA VISUALMENTE A 100% */
-            height: 100%; 
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            color: white; 
-            font-weight: 600;
-        ">
-        {val:.1f}% </div>
-    </div>
-    """
-
-# --- FUNÇÕES DE LÓGICA (Não alteradas) ---
-def normalizar_texto(texto):
-    if not isinstance(texto, str): return str(texto)
-    return unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('utf-8').upper()
-
-def apenas_digitos(texto):
-    return ''.join(filter(str.isdigit, str(texto)))
-
-def classificar_unidade(nome):
-    nome = normalizar_texto(nome)
-    if 'UPA' in nome: return '🚨 UPA'
-    if 'HOSP' in nome or 'SANTA CASA' in nome: return '🏥 HOSPITAL'
-    if 'UMS' in nome: return '🩺 UMS'
-    if 'UBS' in nome: return '💉 UBS'
-    if 'ESF' in nome: return '👩‍⚕️ ESF'
-    if 'CENTRO' in nome: return '🏢 CENTRO'
-    return '📍 OUTROS'
-
-def identificar_mes_por_arquivo(nome_arquivo):
-    nome_limpo = str(nome_arquivo).lower().replace('.csv', '').strip()
-    if not nome_limpo: return "Desconhecido"
-    ultimo_digito = nome_limpo[-1]
-    mapa_meses = {
-        '1': 'Janeiro', '2': 'Fevereiro', '3': 'Março', '4': 'Abril',
-        '5': 'Maio', '6': 'Junho', '7': 'Julho', '8': 'Agosto',
-        '9': 'Setembro', '0': 'Outubro', 'o': 'Outubro', 'n': 'Novembro', 'd': 'Dezembro'
-    }
-    return mapa_meses.get(ultimo_digito, f"Arquivo Final {ultimo_digito}")
-
-def encontrar_coluna_valor(df_columns):
-    cols_norm = [normalizar_texto(c) for c in df_columns]
-    for i, col_norm in enumerate(cols_norm):
-        # Procura genérica por coluna de orçamento/valor total
-        if 'TOTAL' in col_norm and 'ORC' in col_norm: return df_columns[i]
-        if 'ORCAMENT' in col_norm: return df_columns[i]
-        if 'VLR TOTAL' in col_norm: return df_columns[i]
-    # Fallback pela posição (colunas 8 ou 9 costumam ser valores no espelho padrão)
-    if len(df_columns) > 8: return df_columns[8]
-    return None
-
-def extrair_dicionario_procedimentos(df, origem="Desconhecida"):
-    dict_encontrado = {}
-    headers_norm = [normalizar_texto(c) for c in df.columns]
-    idx_cod, idx_desc = -1, -1
-    
-    for i, h in enumerate(headers_norm):
-        if 'PROC_ID' in h or 'PROCEDIM' in h or ('COD' in h and 'PROC' in h): idx_cod = i; break
-    for i, h in enumerate(headers_norm):
-        if 'DESCR' in h or ('NOME' in h and 'PROC' in h) or 'DS_PROC' in h: idx_desc = i; break
-            
-    if idx_cod != -1 and idx_desc != -1:
-        col_cod, col_desc = df.columns[idx_cod], df.columns[idx_desc]
+def estilo_execucao(val):
+    """CSS da célula de execução, com a mesma regra de cores da barra."""
+    return f"background-color: {get_color_hex(val)}; color: white; font-weight: 600;"
+
+# --- FUNÇÕES DE LÓGICA ---
+def load_data_raw(files_papa, files_espelho, leitura_em_blocos=False, workers=1, usar_processos=False):
+    return carregar_dados(files_papa, files_espelho, leitura_em_blocos, workers, usar_processos)
+
+@st.cache_resource
+def registro_compartilhado():
+    """Conjuntos carregados, um por conteúdo de arquivos, compartilhados entre as sessões."""
+    return RegistroDados()
+
+@st.cache_resource
+def cache_compartilhado():
+    """Visões derivadas (consolidado, recortes, abas), compartilhadas entre todas as sessões."""
+    return CacheResultados()
+
+@st.cache_resource
+def exportador_compartilhado():
+    """Fila de exportações em segundo plano; o mesmo pedido de outra sessão reaproveita o arquivo."""
+    return Exportador()
+
+def ler_exportacao(exportador, chave, formato, montar_tabelas):
+    """Bytes do arquivo exportado. Se já foi descartado (limite de arquivos), é gerado de novo antes de baixar."""
+    for _ in range(2):
+        tarefa = exportador.tarefa(chave) or exportador.solicitar(chave, formato, montar_tabelas)
         try:
-            temp = df[[col_cod, col_desc]].dropna().drop_duplicates()
-            for k, v in zip(temp[col_cod], temp[col_desc]):
-                k_clean = apenas_digitos(str(k))
-                if k_clean and isinstance(v, str):
-                    v_limpo = v.strip().upper()
-                    dict_encontrado[k_clean] = v_limpo
-                    try: dict_encontrado[str(int(k_clean))] = v_limpo
-                    except: pass
-                    try: dict_encontrado[k_clean.zfill(10)] = v_limpo
-                    except: pass
-        except: pass
-    return dict_encontrado
-
-# Função para formatar moeda no padrão BR (ajustada para garantir o padrão)
-def formatar_brl(valor):
-    if pd.isna(valor): return "R$ 0,00"
-    try:
-        # Formatação com ponto como milhar e vírgula como decimal
-        return "R$ {:,.2f}".format(valor).replace(",", "X").replace(".", ",").replace("X", ".")
-    except ValueError:
-        return "R$ 0,00"
-
-@st.cache_data
-def load_data_raw(files_papa, files_espelho):
-    df_papa = pd.DataFrame()
-    if files_papa:
-        papa_dfs = []
-        for file in files_papa:
-            try: 
-                file.seek(0); df_temp = pd.read_csv(file, sep=',', encoding='latin1', dtype=str)
-            except: 
-                file.seek(0); df_temp = pd.read_csv(file, sep=';', encoding='latin1', dtype=str)
-            df_temp['MES_NOME'] = identificar_mes_por_arquivo(file.name)
-            papa_dfs.append(df_temp)
-        
-        if papa_dfs:
-            df_papa = pd.concat(papa_dfs, ignore_index=True)
-            if 'PA_NAT_JUR' in df_papa.columns:
-                df_papa['PA_NAT_JUR'] = df_papa['PA_NAT_JUR'].astype(str).str.strip()
-                df_papa = df_papa[df_papa['PA_NAT_JUR'] == '1031']
-            
-            col_val = next((c for c in df_papa.columns if 'VALAPR' in c), 'PA_VALAPR')
-            df_papa[col_val] = df_papa[col_val].astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False).fillna('0').astype(float)
-            
-            col_cnes = next((c for c in df_papa.columns if 'CODUNI' in c), 'PA_CODUNI')
-            df_papa['CNES_KEY'] = df_papa[col_cnes].astype(str).str.strip().str.replace('"', '').str.zfill(7)
-
-    df_espelho = pd.DataFrame()
-    teto_agrupado = pd.DataFrame()
-    if files_espelho:
-        espelho_dfs = []
-        target_files = files_espelho if isinstance(files_espelho, list) else [files_espelho]
-        for file in target_files:
-            try: file.seek(0); df_temp = pd.read_csv(file, sep=',', encoding='latin1', dtype=str)
-            except: file.seek(0); df_temp = pd.read_csv(file, sep=';', encoding='latin1', dtype=str)
-            espelho_dfs.append(df_temp)
-        if espelho_dfs:
-            df_espelho = pd.concat(espelho_dfs, ignore_index=True)
-            col_teto = encontrar_coluna_valor(df_espelho.columns)
-            
-            if col_teto:
-                df_espelho['Valor_Teto'] = df_espelho[col_teto].astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False).fillna('0').astype(float)
-                
-                headers_esp = [normalizar_texto(c) for c in df_espelho.columns]
-                idx_cnes = next((i for i, h in enumerate(headers_esp) if 'CNES' in h), 11)
-                col_cnes = df_espelho.columns[idx_cnes]
-                
-                idx_nome = next((i for i, h in enumerate(headers_esp) if ('NOME' in h and 'ESTAB' in h) or 'UNIDADE' in h), 12)
-                col_nome = df_espelho.columns[idx_nome]
-                
-                df_espelho['CNES_KEY'] = df_espelho[col_cnes].astype(str).str.strip().str.replace('"', '').str.zfill(7)
-                teto_agrupado = df_espelho.groupby(['CNES_KEY', col_nome])['Valor_Teto'].sum().reset_index()
-                teto_agrupado.rename(columns={col_nome: 'Unidade'}, inplace=True)
-
-    dict_proc = {}
-    if not df_papa.empty: dict_proc.update(extrair_dicionario_procedimentos(df_papa, "PAPA"))
-    if not df_espelho.empty: dict_proc.update(extrair_dicionario_procedimentos(df_espelho, "ESPELHO"))
-    
-    return df_papa, teto_agrupado, dict_proc
+            with open(tarefa.result(), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            continue  # Descartado entre a consulta e a leitura: a próxima volta pede de novo
+    raise FileNotFoundError("O arquivo exportado foi descartado; gere-o novamente.")
+
+def painel_exportacao(chave, formato, nome_arquivo, montar_tabelas):
+    """Gerar/baixar a exportação. Enquanto o arquivo é gerado, só este trecho se atualiza (fragmento)."""
+    tarefa = exportador_compartilhado().tarefa(chave)
+    gerando = tarefa is not None and not tarefa.done()
+
+    @st.fragment(run_every=1 if gerando else None)
+    def situacao():
+        tarefa = exportador_compartilhado().tarefa(chave)
+        if tarefa is not None and not tarefa.done():
+            st.caption("⏳ Gerando o arquivo em segundo plano...")
+        elif gerando:
+            st.rerun()  # Terminou: redesenha sem a atualização periódica
+        elif tarefa is None or tarefa.exception() is not None:
+            if tarefa is not None: st.error(f"Falha na exportação: {tarefa.exception()}")
+            if st.button("⚙️ Gerar arquivo", key="exp_gerar"):
+                exportador_compartilhado().solicitar(chave, formato, montar_tabelas)
+                st.rerun()
+        else:
+            extensao, mime = FORMATOS[formato]
+            exportador = exportador_compartilhado()
+            st.download_button("⬇️ Baixar", lambda: ler_exportacao(exportador, chave, formato, montar_tabelas), file_name=f"{nome_arquivo}.{extensao}", mime=mime, on_click="ignore", key="exp_baixar")
+    situacao()
+
+def versao_dos_arquivos(files):
+    """Hash do conteúdo dos uploads: quem enviar os mesmos arquivos chega à mesma versão.
+
+    O hash é calculado uma vez por envio (file_id) e guardado na sessão.
+    """
+    hashes = st.session_state.setdefault('hash_uploads', {})
+    versao = []
+    for f in files or []:
+        chave = getattr(f, 'file_id', None) or getattr(f, 'name', '')
+        if chave not in hashes: hashes[chave] = hash_conteudo(f)
+        versao.append(hashes[chave])
+    return tuple(sorted(versao))
 
-def processar_consolidado(df_papa_filtrado, df_teto):
-    if df_papa_filtrado.empty:
-        final = df_teto.copy(); final['Valor_Produzido'] = 0.0
-    else:
-        col_val = next((c for c in df_papa_filtrado.columns if 'VALAPR' in c), 'PA_VALAPR')
-        prod = df_papa_filtrado.groupby('CNES_KEY')[col_val].sum().reset_index()
-        prod.rename(columns={col_val: 'Valor_Produzido'}, inplace=True)
-        final = pd.merge(df_teto, prod, on='CNES_KEY', how='outer').fillna(0)
-    
-    final['Unidade'] = final['Unidade'].replace(0, 'Unidade Desconhecida').replace('0', 'Unidade Desconhecida').astype(str)
-    final['Saldo'] = final['Valor_Teto'] - final['Valor_Produzido']
-    final['% Execucao'] = final.apply(lambda x: (x['Valor_Produzido'] / x['Valor_Teto'] * 100) if x['Valor_Teto'] > 0 else 0, axis=1)
-    final['Categoria'] = final['Unidade'].apply(classificar_unidade)
-    return final
+def memo_visao(estado, nome, calcular):
+    return cache_compartilhado().obter(versao_dados, estado, nome, calcular)
 
 # --- SIDEBAR ---
+TIPOS_ARQUIVO = ["csv", "zip", "gz", "zst"]
+# O log do rerun é gravado mesmo quando uma etapa falha (o campo erro vem preenchido)
 with st.sidebar:
     st.image("https://upload.wikimedia.org/wikipedia/commons/thumb/6/68/SUS_Logo.svg/1200px-SUS_Logo.svg.png", width=140)
     st.markdown("### 📥 Central de Dados")
-    files_papa = st.file_uploader("📂 Produção (PAPA) - Múltiplos", type="csv", accept_multiple_files=True)
-    files_espelho = st.file_uploader("💰 Teto (Espelho) - Múltiplos", type="csv", accept_multiple_files=True)
+    files_papa = st.file_uploader("📂 Produção (PAPA) - Múltiplos", type=TIPOS_ARQUIVO, accept_multiple_files=True, help="CSV ou compactado (zip, gz, zst). Um zip pode trazer vários meses (PAPA2501, PAPA2502...).")
+    files_espelho = st.file_uploader("💰 Teto (Espelho) - Múltiplos", type=TIPOS_ARQUIVO, accept_multiple_files=True)
     st.markdown("---")
     st.caption("Filtro Automático: Natureza Jurídica **1031**")
-    
+    with st.expander("⚙️ Opções de leitura"):
+        st.caption("Só valem para conteúdo ainda não carregado: os mesmos arquivos reaproveitam o conjunto já processado, inclusive após reiniciar.")
+        workers_leitura = st.number_input("Workers de leitura", min_value=1, max_value=32, value=WORKERS_PADRAO, help="Quantidade de arquivos lidos ao mesmo tempo (padrão pela variável SUS_WORKERS).")
+        usar_processos = st.checkbox("Usar processos em vez de threads", value=USAR_PROCESSOS_PADRAO, help="Processos aproveitam todos os núcleos em arquivos grandes, com custo maior de inicialização.")
+        leitura_em_blocos = st.checkbox("⚡ Leitura em blocos (baixo uso de memória)", value=os.environ.get("SUS_LEITURA_BLOCOS", "") in ("1", "true", "TRUE"), help="Lê o PAPA em partes, mantendo só as colunas usadas e já agregando por unidade, mês e procedimento.")
+    abas_sob_demanda = st.checkbox("🗂️ Abas sob demanda", value=os.environ.get("SUS_ABAS_SOB_DEMANDA", "1") not in ("0", "false", "FALSE"), help="Calcula só a aba aberta; ao voltar para uma aba com os mesmos filtros, o resultado já está pronto.")
+    with st.expander("📦 Resultados pré-processados"):
+        dir_resultados = st.text_input("Pasta dos resultados", value=os.environ.get("SUS_DIR_RESULTADOS", ""), help="Saída do processar_lote.py. Quando um município é escolhido, os uploads são ignorados.")
+        opcoes_resultados = listar_resultados(dir_resultados)
+        resultado_sel = st.selectbox("Município", ["—"] + opcoes_resultados, format_func=lambda p: p if p == "—" else os.path.basename(os.path.normpath(p)))
+
     filtros_data_container = st.container()
     filtros_unidade_container = st.container()
 
 # --- MAIN LAYOUT ---
 st.markdown('<div class="header-container"><h1>Gestão Estratégica SIA/SUS</h1><p>Intelligence Dashboard • Teto vs Produção • Tendências</p></div>', unsafe_allow_html=True)
 
-if files_papa and files_espelho:
-    df_papa_raw, df_teto, dict_procedimentos = load_data_raw(files_papa, files_espelho)
-    num_meses_papa = len(files_papa) if files_papa else 1
-    
+if resultado_sel != "—" or (files_papa and files_espelho):
+    if resultado_sel != "—":
+        with rastreador.etapa('load_resultados') as etapa:
+            versao_dados, (cubo_papa, df_teto, catalogo_procedimentos, tempos_leitura) = registro_compartilhado().obter_resultado(resultado_sel)
+            etapa['linhas'] = len(cubo_papa)
+    else:
+        # Mesmo conteúdo = mesmo conjunto: processado uma vez e compartilhado por todas as sessões
+        versao_dados = id_conjunto(versao_dos_arquivos(files_papa), versao_dos_arquivos(files_espelho))
+        with rastreador.etapa('load_data_raw') as etapa:
+            cubo_papa, df_teto, catalogo_procedimentos, tempos_leitura = registro_compartilhado().obter(versao_dados, lambda: load_data_raw(files_papa, files_espelho, leitura_em_blocos, int(workers_leitura), usar_processos))
+            etapa['linhas'] = len(cubo_papa)
+    if not tempos_leitura.empty:
+        with st.sidebar.expander("⏱️ Tempos de leitura por arquivo"):
+            st.dataframe(tempos_leitura.style.format({'Segundos': '{:.2f}'}), width='stretch', hide_index=True)
+
     if not df_teto.empty:
         # --- FILTROS NA SIDEBAR ---
-        ordem_meses = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho', 'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
-        meses_disp = list(df_papa_raw['MES_NOME'].unique()) if not df_papa_raw.empty else []
-        meses_ord = sorted(meses_disp, key=lambda x: ordem_meses.index(x) if x in ordem_meses else 99)
-        
+        # Competências (AAAAMM) lidas dos dados, em ordem cronológica: o período pode atravessar anos
+        competencias_ord = competencias_disponiveis(cubo_papa)
+    
         # Filtro de Período
-        if meses_ord:
+        if competencias_ord:
             with filtros_data_container:
                 st.subheader("📅 Período")
-                sel_meses = st.multiselect("Selecione os Meses:", meses_ord, default=meses_ord)
-        else: sel_meses = []
+                sel_competencias = st.multiselect("Selecione as Competências:", competencias_ord, default=competencias_ord, format_func=rotulo_competencia)
+        else: sel_competencias = []
 
-        df_papa_final = df_papa_raw[df_papa_raw['MES_NOME'].isin(sel_meses)] if not df_papa_raw.empty else pd.DataFrame()
-        df = processar_consolidado(df_papa_final, df_teto)
-        
-        if not df_papa_raw.empty:
-            valid_cnes = df_papa_raw['CNES_KEY'].unique()
-            df = df[df['CNES_KEY'].isin(valid_cnes)]
-        
+        # Consolidado e recortes vêm do cache compartilhado (mesmos dados e filtros = mesmo resultado)
+        with rastreador.etapa('processar_consolidado', linhas=len(cubo_papa)):
+            cubo_periodo, df = memo_visao(normalizar_filtros(sel_competencias), 'consolidado', lambda: (fatiar(cubo_papa, competencias=sel_competencias), consolidar_periodo(cubo_papa, df_teto, sel_competencias)))
+    
         # ⚠️ NOVO BLOCO DE FILTROS NA PÁGINA PRINCIPAL
         st.markdown("---")
-        
+    
         c_f1, c_f2 = st.columns([1, 3])
         cats = sorted(df['Categoria'].unique())
-        
+    
         # Filtro de Categoria na página principal (c_f1)
         sel_cat = c_f1.multiselect("🏷️ Filtrar Categoria:", cats)
-        df_filtered = df[df['Categoria'].isin(sel_cat)] if sel_cat else df
-        
+        df_filtered = memo_visao(normalizar_filtros(sel_competencias, sel_cat), 'recorte_categoria', lambda: df[df['Categoria'].isin(sel_cat)]) if sel_cat else df
+    
         # Filtro de Unidade na página principal (c_f2) - Mantido aqui para seguir o layout original, apesar de ser grande
         units = sorted(df_filtered['Unidade'].unique())
         sel_unit = c_f2.multiselect("🏥 Filtrar Unidade:", units)
-        df_view = df_filtered[df_filtered['Unidade'].isin(sel_unit)] if sel_unit else df_filtered
+        df_view = memo_visao(normalizar_filtros(sel_competencias, sel_cat, sel_unit), 'recorte_unidade', lambda: df_filtered[df_filtered['Unidade'].isin(sel_unit)]) if sel_unit else df_filtered
+
+        # --- EXPORTAÇÃO (segundo plano, a partir das visões já agregadas) ---
+        with st.sidebar.expander("📤 Exportar seleção"):
+            formato_exportacao = st.selectbox("Formato", list(FORMATOS), key="exp_formato", help="Excel com uma aba por tabela; Parquet e CSV em zip, um arquivo por tabela.")
+            periodo_exportacao = f"{min(sel_competencias)}-{max(sel_competencias)}" if sel_competencias else "completo"
+            painel_exportacao(
+                chave_exportacao(versao_dados, normalizar_filtros(sel_competencias, sel_cat, sel_unit), formato_exportacao), formato_exportacao, f"sus_execucao_{periodo_exportacao}",
+                lambda: tabelas_exportacao(df_view, cubo_periodo, catalogo_procedimentos))
 
         st.markdown("---")
 
         # --- KPIs ---
-        teto_base = df_view['Valor_Teto'].sum()
-        teto_total = teto_base * num_meses_papa 
+        # Valor_Teto já é o acumulado do período (teto vigente somado competência a competência)
+        teto_mensal = df_view['Teto_Mensal'].sum()
+        teto_total = df_view['Valor_Teto'].sum()
         prod = df_view['Valor_Produzido'].sum()
         saldo = teto_total - prod
         perc = (prod / teto_total * 100) if teto_total > 0 else 0
-        
+    
         # CÁLCULO: Saldo em % do Teto (Diferença Percentual)
         saldo_perc = 100 - perc
-        
+    
         # Configuração de cor do Delta para os KPIs
         saldo_delta_color = "inverse" if saldo < 0 else "normal"
         prod_delta_color = "normal" if perc >= 100 else "off"
 
         c1, c2, c3, c4 = st.columns(4)
-        
+    
         # KPI 1: Teto Acumulado
-        c1.metric("💰 Teto Global (Acumulado)", formatar_brl(teto_total), help=f"Base Mensal: {formatar_brl(teto_base)} x {num_meses_papa} meses")
-        
+        c1.metric("💰 Teto Global (Acumulado)", formatar_brl(teto_total), help=f"Teto vigente em {len(sel_competencias)} competência(s). Teto mensal atual: {formatar_brl(teto_mensal)}")
+    
         # KPI 2: Produção Acumulada (com Execução % como delta)
         c2.metric("📊 Produção Realizada", formatar_brl(prod), delta=f"{perc:.1f}% de Execução", delta_color=prod_delta_color)
-        
+    
         # KPI 3: Saldo Disponível (com Diferença % como delta)
         c3.metric("📉 Saldo Disponível", formatar_brl(saldo), delta=f"{saldo_perc:.1f}% do Teto", delta_color=saldo_delta_color)
-        
+    
         # KPI 4: Execução Média (Mantido para mostrar a taxa principal)
         c4.metric("📈 Execução Média", f"{perc:.1f}%", f"{len(df_view)} Unidades")
-        
+    
         st.markdown("---")
 
         # --- ABAS (Definição Correta) ---
-        tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Visão Geral", "📈 Evolução", "🩺 Top Procedimentos", "📋 Dados Detalhados", "🏥 Mapeamento CNES"])
-        
+        # Sob demanda: só a aba aberta é calculada; o resultado fica no cache compartilhado para este estado de filtros
+        estado_filtros = normalizar_filtros(sel_competencias, sel_cat, sel_unit)
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Visão Geral", "📈 Evolução", "🩺 Top Procedimentos", "📋 Dados Detalhados", "🏥 Mapeamento CNES"], key="aba_ativa", on_change="rerun" if abas_sob_demanda else "ignore")
+        def aba_visivel(tab): return not abas_sob_demanda or tab.open
+    
         # ABA 1: Visão Geral (Gráfico Teto vs Produção)
-        with tab1:
+        with tab1, rastreador.etapa('aba/visao_geral', linhas=len(df_view)):
             st.subheader("Performance por Unidade (Top 10 por Teto)")
-            df_chart = df_view.sort_values('Valor_Teto', ascending=False).head(10).copy()
-            df_chart['Valor_Teto_Acumulado'] = df_chart['Valor_Teto'] * num_meses_papa
-            
+        
             # Wrap de texto para o eixo X
             def quebrar_texto_unidade(texto, limite=15):
                 if not isinstance(texto, str): return str(texto)
@@ -425,115 +355,135 @@ if files_papa and files_espelho:
                     else: linha_atual.append(p); contagem += len(p) + 1
                 if linha_atual: linhas.append(" ".join(linha_atual))
                 return "<br>".join(linhas)
+        
+            def montar_visao_geral():
+                df_chart = df_view.sort_values('Valor_Teto', ascending=False).head(10).copy()
+                df_chart['Unidade_Wrap'] = df_chart['Unidade'].apply(lambda x: quebrar_texto_unidade(x, 15))
             
-            df_chart['Unidade_Wrap'] = df_chart['Unidade'].apply(lambda x: quebrar_texto_unidade(x, 15))
-            
-            fig = go.Figure()
-            # Teto (Cinza/Fundo)
-            fig.add_trace(go.Bar(x=df_chart['Unidade_Wrap'], y=df_chart['Valor_Teto_Acumulado'], name='Teto (Acumulado)', marker_color='#95a5a6', opacity=0.9, text=df_chart['Valor_Teto_Acumulado'].apply(formatar_brl), textposition='outside'))
-            # Produção (Azul/Destaque)
-            fig.add_trace(go.Bar(x=df_chart['Unidade_Wrap'], y=df_chart['Valor_Produzido'], name='Produção', marker_color='#3498db', text=df_chart['Valor_Produzido'].apply(formatar_brl), textposition='auto'))
+                fig = go.Figure()
+                # Teto (Cinza/Fundo)
+                fig.add_trace(go.Bar(x=df_chart['Unidade_Wrap'], y=df_chart['Valor_Teto'], name='Teto (Acumulado)', marker_color='#95a5a6', opacity=0.9, text=formatar_brl(df_chart['Valor_Teto']), textposition='outside'))
+                # Produção (Azul/Destaque)
+                fig.add_trace(go.Bar(x=df_chart['Unidade_Wrap'], y=df_chart['Valor_Produzido'], name='Produção', marker_color='#3498db', text=formatar_brl(df_chart['Valor_Produzido']), textposition='auto'))
             
-            fig.update_layout(
-                barmode='group', 
-                xaxis_tickangle=0, 
-                legend=dict(orientation="h", y=1.1, x=0.5, xanchor='center'), 
-                margin=dict(t=40), 
-                height=500, 
-                plot_bgcolor='white',
-                yaxis_title="Valor (R$)"
-            )
-            st.plotly_chart(fig, use_container_width=True)
+                fig.update_layout(
+                    barmode='group', 
+                    xaxis_tickangle=0, 
+                    legend=dict(orientation="h", y=1.1, x=0.5, xanchor='center'), 
+                    margin=dict(t=40), 
+                    height=500, 
+                    plot_bgcolor='white',
+                    yaxis_title="Valor (R$)"
+                )
+                return fig
+        
+            if aba_visivel(tab1):
+                st.plotly_chart(memo_visao(estado_filtros, 'visao_geral', montar_visao_geral), width='stretch')
 
         # ABA 2: Evolução (Timeline)
-        with tab2:
+        with tab2, rastreador.etapa('aba/evolucao') as etapa:
             st.subheader("Evolução Mensal da Produção")
-            if not df_papa_final.empty:
-                col_val = next((c for c in df_papa_final.columns if 'VALAPR' in c), 'PA_VALAPR')
+            # Com mais de um ano no período, dá para ver a soma por ano
+            varios_anos = len({c[:4] for c in sel_competencias}) > 1
+            por_ano = varios_anos and st.segmented_control("Agrupar por", ["Competência", "Ano"], default="Competência", key="evo_grao") == "Ano"
+        
+            def montar_evolucao():
+                col_val = 'PA_VALAPR'
                 cnese = df_view['CNES_KEY'].unique()
-                timeline = df_papa_final[df_papa_final['CNES_KEY'].isin(cnese)].groupby('MES_NOME')[col_val].sum().reset_index()
-                timeline['Ordem'] = timeline['MES_NOME'].apply(lambda x: ordem_meses.index(x) if x in ordem_meses else 99)
-                timeline = timeline.sort_values('Ordem')
-                if not timeline.empty:
-                    fig_line = px.line(timeline, x='MES_NOME', y=col_val, markers=True, text=timeline[col_val].apply(formatar_brl))
-                    fig_line.update_traces(line_color='#3498db', line_width=4, textposition='top center')
-                    fig_line.update_layout(plot_bgcolor='white', yaxis_title='Valor Produzido (R$)', xaxis_title='Mês')
-                    st.plotly_chart(fig_line, use_container_width=True)
+                timeline = calcular_timeline(cubo_periodo, cnes=cnese, por_ano=por_ano)
+                if timeline.empty: return None
+                fig_line = px.line(timeline, x='Periodo', y=col_val, markers=True, text=formatar_brl(timeline[col_val]))
+                fig_line.update_traces(line_color='#3498db', line_width=4, textposition='top center')
+                fig_line.update_layout(plot_bgcolor='white', yaxis_title='Valor Produzido (R$)', xaxis_title='Ano' if por_ano else 'Competência')
+                return fig_line
+        
+            # Aba fechada não consulta o cubo (nem para contar linhas: fora da memória, é uma varredura)
+            if aba_visivel(tab2) and not cubo_periodo.empty:
+                etapa['linhas'] = len(cubo_periodo)
+                fig_line = memo_visao(estado_filtros, 'evolucao_ano' if por_ano else 'evolucao', montar_evolucao)
+                if fig_line is not None:
+                    st.plotly_chart(fig_line, width='stretch')
                 else: st.info("Sem dados temporais para a seleção atual.")
 
 
         # ABA 3: Top Procedimentos
-        with tab3:
+        with tab3, rastreador.etapa('aba/top_procedimentos') as etapa:
             st.subheader("Top 5 Procedimentos por Valor")
-            if not df_papa_final.empty:
-                col_val = next((c for c in df_papa_final.columns if 'VALAPR' in c), 'PA_VALAPR')
-                col_proc_id = next((c for c in df_papa_final.columns if 'PROC_ID' in c), 'PA_PROC_ID')
-                
+        
+            def montar_top_procedimentos():
+                col_val = 'PA_VALAPR'
+                col_proc_id = 'PA_PROC_ID'
+            
                 cnese = df_view['CNES_KEY'].unique()
-                df_proc = df_papa_final[df_papa_final['CNES_KEY'].isin(cnese)]
-                top_proc = df_proc.groupby(col_proc_id)[col_val].sum().reset_index().sort_values(col_val, ascending=False).head(5)
-                
-                # Mapeamento de Nomes
-                def get_nome_proc(cod, wrap=True):
-                    c = apenas_digitos(str(cod))
-                    nome = dict_procedimentos.get(c, dict_procedimentos.get(str(int(c)) if c.isdigit() else c, f"Proc. {cod}"))
-                    if wrap:
-                        return "<br>".join([nome[i:i+25] for i in range(0, len(nome), 25)])
-                    return nome
-
-                top_proc['Nome_Grafico'] = top_proc[col_proc_id].apply(lambda x: get_nome_proc(x, True))
-                top_proc['Nome_Tabela'] = top_proc[col_proc_id].apply(lambda x: get_nome_proc(x, False))
-                
-                fig_bar_v = px.bar(top_proc, x='Nome_Grafico', y=col_val, text=top_proc[col_val].apply(formatar_brl), title="")
+                top_proc = calcular_top_procedimentos(cubo_periodo, catalogo_procedimentos, cnes=cnese, n=5)
+            
+                # Nomes vêm do catálogo (uma consulta para a Series inteira)
+                top_proc['Nome_Tabela'] = top_proc['Procedimento']
+                top_proc['Nome_Grafico'] = top_proc['Nome_Tabela'].str.findall('.{1,25}').str.join('<br>')
+            
+                fig_bar_v = px.bar(top_proc, x='Nome_Grafico', y=col_val, text=formatar_brl(top_proc[col_val]), title="")
                 fig_bar_v.update_traces(marker_color='#1abc9c', textposition='auto')
                 fig_bar_v.update_layout(xaxis={'title': None, 'tickangle': 0}, yaxis_title="Valor (R$)", height=600, plot_bgcolor='white')
-                st.plotly_chart(fig_bar_v, use_container_width=True)
-                
+            
+                # Formatação BR da coluna inteira antes de exibir
+                tabela = top_proc[[col_proc_id, 'Nome_Tabela', col_val]].rename(columns={col_proc_id:'Código', 'Nome_Tabela':'Procedimento', col_val:'Valor Total'}).assign(**{'Valor Total': lambda d: formatar_brl(d['Valor Total'])})
+                return fig_bar_v, tabela
+        
+            if aba_visivel(tab3) and not cubo_periodo.empty:
+                etapa['linhas'] = len(cubo_periodo)
+                fig_bar_v, tabela_top = memo_visao(estado_filtros, 'top_procedimentos', montar_top_procedimentos)
+                st.plotly_chart(fig_bar_v, width='stretch')
+            
                 st.divider()
-                # Aplica a formatação BR no pandas Styler
-                st.dataframe(top_proc[[col_proc_id, 'Nome_Tabela', col_val]].rename(columns={col_proc_id:'Código', 'Nome_Tabela':'Procedimento', col_val:'Valor Total'}).style.format({'Valor Total': formatar_brl}), use_container_width=True)
+                st.dataframe(tabela_top, width='stretch')
 
-        # ABA 4: DADOS BRUTOS COM BARRA DE PROGRESSO (CORRIGIDA COM HTML)
-        with tab4:
+        # ABA 4: DADOS DETALHADOS (PAGINADOS NO SERVIDOR, BARRA NATIVA)
+        with tab4, rastreador.etapa('aba/dados_detalhados', linhas=len(df_view)):
             st.subheader("Detalhes da Execução por Unidade")
-            df_exibicao = df_view[['Unidade', 'Valor_Teto', 'Valor_Produzido', 'Saldo', '% Execucao']].copy()
-            df_exibicao['Valor_Teto'] = df_exibicao['Valor_Teto'] * num_meses_papa
-            df_exibicao['Saldo'] = df_exibicao['Valor_Teto'] - df_exibicao['Valor_Produzido']
-            df_exibicao['% Execucao'] = df_exibicao['% Execucao'] 
-            
-            # Formatação do DataFrame usando a formatação BR
-            df_styled = df_exibicao.copy()
-            df_styled.rename(columns={'Valor_Teto': 'Teto Acumulado', 'Valor_Produzido': 'Produção Total', '% Execucao': 'Execução (%)'}, inplace=True)
-            
-            # Cria a coluna com o HTML da barra de progresso (incluindo a porcentagem dentro do HTML)
-            df_styled['Barra de Execução'] = df_styled['Execução (%)'].apply(style_progress_bar_html)
-
-            # Aplica formatação monetária nas colunas (Função de Styler)
-            def format_monetary(df):
-                return df.style.format({
-                    'Teto Acumulado': formatar_brl,
-                    'Produção Total': formatar_brl,
-                    'Saldo': formatar_brl,
-                })
-            
-            # O DataFrame a ser estilizado
-            df_to_style = df_styled[['Unidade', 'Teto Acumulado', 'Produção Total', 'Saldo', 'Barra de Execução']].copy()
+        
+            # Os controles são sempre desenhados (baratos) para manter busca e ordenação ao trocar de aba
+            c_busca, c_ordem, c_dir, c_tam = st.columns([3, 2, 1, 1])
+            busca = c_busca.text_input("🔎 Buscar unidade", key="det_busca")
+            colunas_ordem = ['Teto Acumulado', 'Produção Total', 'Saldo', 'Execução (%)', 'Unidade']
+            coluna_ordem = c_ordem.selectbox("Ordenar por", colunas_ordem, key="det_ordem")
+            crescente = c_dir.toggle("Crescente", value=(coluna_ordem == 'Unidade'), key="det_crescente")
+            tamanho_pagina = c_tam.selectbox("Linhas/página", TAMANHOS_PAGINA, index=1, key="det_tamanho")
+        
+            def montar_detalhes():
+                df_exibicao = df_view[['Unidade', 'Valor_Teto', 'Valor_Produzido', 'Saldo', '% Execucao']].copy()
+                df_exibicao.rename(columns={'Valor_Teto': 'Teto Acumulado', 'Valor_Produzido': 'Produção Total', '% Execucao': 'Execução (%)'}, inplace=True)
+                return filtrar_ordenar(df_exibicao, busca, coluna_ordem, crescente)
+        
+            if aba_visivel(tab4):
+                # Busca, ordenação e paginação acontecem aqui; o navegador recebe só a página visível
+                df_det = memo_visao(normalizar_filtros(sel_competencias, sel_cat, sel_unit, busca=busca, ordem=coluna_ordem, crescente=crescente), 'dados_detalhados', montar_detalhes)
+                n_paginas = total_paginas(len(df_det), tamanho_pagina)
+                pagina = st.number_input(f"Página (de {n_paginas})", min_value=1, max_value=n_paginas, value=1, key="det_pagina") if n_paginas > 1 else 1
+                df_pagina, inicio = recortar_pagina(df_det, pagina, tamanho_pagina)
             
-            # Aplica o estilo na coluna da barra de progresso e depois no restante
-            # Necessário para que o HTML seja renderizado
-            styled_df = format_monetary(df_to_style)
+                # A barra é nativa (limitada visualmente a 100%); a cor segue get_color_hex na coluna de %
+                df_pagina = df_pagina.assign(**{'Barra de Execução': df_pagina['Execução (%)'].clip(0, 100)})
+                df_pagina = df_pagina[['Unidade', 'Teto Acumulado', 'Produção Total', 'Saldo', 'Execução (%)', 'Barra de Execução']]
+                # Moeda formatada por coluna (numeros_br); o Styler fica só com o % e as cores
+                df_pagina = df_pagina.assign(**{col: formatar_brl(df_pagina[col]) for col in ['Teto Acumulado', 'Produção Total', 'Saldo']})
+                styled_df = df_pagina.style.format({'Execução (%)': '{:.1f}%'}).map(estilo_execucao, subset=['Execução (%)'])
             
-            # O to_html() do Pandas gera uma tabela que, por padrão, se ajusta bem a 100%
-            st.markdown(styled_df.to_html(escape=False), unsafe_allow_html=True)
+                st.dataframe(
+                    styled_df, width='stretch', hide_index=True,
+                    column_config={'Barra de Execução': st.column_config.ProgressColumn('Barra de Execução', min_value=0, max_value=100, format='%.1f%%')},
+                )
+                st.caption(f"Mostrando {inicio + 1 if len(df_det) else 0}–{inicio + len(df_pagina)} de {len(df_det)} unidades.")
             
-            st.caption("Nota: A coluna **Barra de Execução** exibe o percentual calculado como (**Produção Total** / **Teto Acumulado**) x 100%, com preenchimento visual limitado a 100%. As cores seguem as regras: Verde (>=80%), Laranja (50% a 79%), Vermelho (<50%).")
+                st.caption("Nota: A coluna **Barra de Execução** exibe o percentual calculado como (**Produção Total** / **Teto Acumulado**) x 100%, com preenchimento visual limitado a 100%. As cores seguem as regras: Verde (>=80%), Laranja (50% a 79%), Vermelho (<50%).")
 
 
         # ABA 5: Mapeamento CNES
-        with tab5:
+        with tab5, rastreador.etapa('aba/mapeamento_cnes', linhas=len(df_view)):
             st.subheader("Mapeamento CNES e Classificação")
-            st.dataframe(df_view[['CNES_KEY', 'Unidade', 'Categoria']].drop_duplicates(), use_container_width=True, height=600)
-            
+            if aba_visivel(tab5):
+                mapeamento = memo_visao(estado_filtros, 'mapeamento_cnes', lambda: df_view[['CNES_KEY', 'Unidade', 'Categoria']].drop_duplicates())
+                st.dataframe(mapeamento, width='stretch', height=600)
+        
     else: 
         st.error("❌ Erro na leitura dos arquivos ou o arquivo 'Teto (Espelho)' está vazio. Verifique se os arquivos CSV estão corretos.")
 else:
@@ -544,4 +494,20 @@ else:
             Para começar, por favor, faça o upload dos arquivos de **Produção (PAPA)** e **Teto (Espelho)** na **barra lateral** à esquerda.
         </p>
     </div>
-    """, unsafe_allow_html=True)
\ No newline at end of file
+    """, unsafe_allow_html=True)
+
+rastreador.exportar()
+
+# --- INSTRUMENTAÇÃO ---
+if admin_ativo() or st.query_params.get("admin") == "1":
+    with st.sidebar.expander("🛠️ Instrumentação do rerun"):
+        tabela_etapas = rastreador.tabela()
+        st.caption(f"Rerun `{rastreador.rerun}` • {tabela_etapas['segundos'].sum():.2f}s medidos")
+        st.dataframe(tabela_etapas[['etapa', 'segundos', 'linhas', 'memoria_delta_mb', 'rss_mb']], width='stretch', hide_index=True)
+        st.download_button("⬇️ Log estruturado (JSONL)", rastreador.linhas_json(), file_name=f"instrumentacao_{rastreador.rerun}.jsonl", mime="application/x-ndjson")
+        st.caption("Conjuntos de dados em memória (compartilhados entre sessões)")
+        st.dataframe(registro_compartilhado().resumo(), width='stretch', hide_index=True)
+        st.caption("Cache de visões (compartilhado entre sessões)")
+        if st.button("🧹 Limpar cache de visões", key="adm_limpar_cache", help="Vale para todas as sessões; as visões são recalculadas no próximo uso."):
+            cache_compartilhado().limpar()
+        st.dataframe(pd.Series(cache_compartilhado().estatisticas(), name='valor').astype(str), width='stretch')
\ No newline at end of file
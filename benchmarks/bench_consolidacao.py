@@ -0,0 +1,58 @@
+"""Micro-benchmark: processar_consolidado vetorizado x versão antiga (apply por linha).
+
+Uso:
+    python benchmarks/bench_consolidacao.py [--escala N] [--repeticoes R]
+
+Usa o espelho_teto_total.csv da raiz do repositório. `--escala` replica as
+unidades com CNES novos para simular municípios maiores. A igualdade com a
+versão antiga é verificada no test_consolidacao.py, de onde vêm as referências.
+
+Com a amostra (~150 nomes, abaixo de MIN_NOMES_ARROW) a classificação é a
+cadeia de `in` nome a nome: sem nomes memorizados ("frio") fica um pouco acima
+do apply antigo, e nos reruns ("quente") abaixo. Os kernels do Arrow só entram
+a partir de MIN_NOMES_ARROW nomes, onde já ganham mesmo a frio.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from consolidacao import ClassificadorUnidades, processar_consolidado  # noqa: E402
+from test_consolidacao import carregar_teto, classificar_unidade_legado, gerar_producao, processar_consolidado_legado  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--escala', type=int, default=1)
+    parser.add_argument('--linhas-por-unidade', type=int, default=20)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    teto = carregar_teto(args.escala)
+    papa = gerar_producao(teto, args.linhas_por_unidade)
+
+    t_antigo = min(timeit.repeat(lambda: processar_consolidado_legado(papa, teto), number=1, repeat=args.repeticoes))
+    t_novo = min(timeit.repeat(lambda: processar_consolidado(papa, teto), number=1, repeat=args.repeticoes))
+    print(f"Unidades: {len(teto):,} | Linhas de produção: {len(papa):,}")
+    print(f"Legado (apply):  {t_antigo * 1000:9.2f} ms")
+    print(f"Vetorizado:      {t_novo * 1000:9.2f} ms")
+    print(f"Ganho:           {t_antigo / t_novo:9.1f}x")
+
+    # Classificação isolada, com o classificador "frio" (sem nomes memorizados) e "quente"
+    nomes = teto['Unidade']
+    t_cls_antigo = min(timeit.repeat(lambda: nomes.apply(classificar_unidade_legado), number=1, repeat=args.repeticoes))
+    t_cls_frio = min(timeit.repeat(lambda: ClassificadorUnidades().classificar_varios(nomes), number=1, repeat=args.repeticoes))
+    classificador = ClassificadorUnidades()
+    classificador.classificar_varios(nomes)
+    t_cls_quente = min(timeit.repeat(lambda: classificador.classificar_varios(nomes), number=1, repeat=args.repeticoes))
+    print(f"Classificação de {nomes.nunique():,} nomes distintos:")
+    print(f"Legado (apply):  {t_cls_antigo * 1000:9.2f} ms")
+    print(f"Regras (frio):   {t_cls_frio * 1000:9.2f} ms")
+    print(f"Regras (quente): {t_cls_quente * 1000:9.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
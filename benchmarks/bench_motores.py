@@ -0,0 +1,88 @@
+"""Compara os motores de consulta do cubo (pandas, Arrow, DuckDB) em resultado e tempo.
+
+Uso:
+    python benchmarks/bench_motores.py [--papa ARQ ...] [--espelho ARQ] [--repeticoes R]
+
+Sem argumentos usa as amostras da raiz do repositório (papa_janeiro.csv e
+espelho_teto_total.csv). O cubo é gravado em Parquet numa pasta temporária e
+as mesmas consultas do dashboard (consolidação, evolução, top procedimentos)
+rodam em cada motor disponível; os resultados precisam bater com o pandas.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+os.environ.setdefault("SUS_CACHE_DESATIVADO", "1")
+
+from cubo import competencias_disponiveis, fatiar  # noqa: E402
+from fontes_cubo import motores_disponiveis  # noqa: E402
+from motor import calcular_timeline, calcular_top_procedimentos, carregar_dados, carregar_resultados, consolidar_periodo, salvar_resultados  # noqa: E402
+
+
+def consultas(cubo, df_teto, catalogo):
+    """As consultas do dashboard sobre um cubo (DataFrame ou fonte)."""
+    competencias = competencias_disponiveis(cubo)
+    cubo_periodo = fatiar(cubo, competencias=competencias)
+    consolidado = consolidar_periodo(cubo, df_teto, competencias)
+    return {
+        'consolidacao': consolidado.sort_values('CNES_KEY').reset_index(drop=True),
+        'evolucao': calcular_timeline(cubo_periodo),
+        'evolucao_unidade': calcular_timeline(cubo_periodo, por_unidade=True),
+        'top_procedimentos': calcular_top_procedimentos(cubo_periodo, catalogo, n=20).reset_index(drop=True),
+    }
+
+
+def consultas_vazias(cubo, df_teto, catalogo):
+    """Seleções vazias (período ou unidades limpos no dashboard): todo motor devolve tabelas vazias."""
+    sem_periodo = fatiar(cubo, competencias=[])
+    sem_unidades = fatiar(cubo, cnes=[])
+    return {
+        'vazio/registros': pd.DataFrame({'n': [len(sem_periodo), len(sem_unidades)]}),
+        'vazio/competencias': pd.DataFrame({'c': competencias_disponiveis(sem_periodo)}, dtype=str),
+        'vazio/consolidacao': consolidar_periodo(cubo, df_teto, []).sort_values('CNES_KEY').reset_index(drop=True),
+        'vazio/evolucao': calcular_timeline(sem_periodo),
+        'vazio/evolucao_unidades': calcular_timeline(sem_unidades, por_unidade=True),
+        'vazio/top_procedimentos': calcular_top_procedimentos(sem_unidades, catalogo, n=20).reset_index(drop=True),
+    }
+
+
+def normalizar(df):
+    """Texto nas dimensões e centavos nas medidas, para comparar motores."""
+    df = df.copy()
+    for c in df.columns:
+        df[c] = df[c].round(2) if pd.api.types.is_float_dtype(df[c]) else df[c].astype(str)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--papa', nargs='+', default=[os.path.join(RAIZ, 'papa_janeiro.csv')])
+    parser.add_argument('--espelho', default=os.path.join(RAIZ, 'espelho_teto_total.csv'))
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    cubo, df_teto, catalogo, _ = carregar_dados(args.papa, [args.espelho], leitura_em_blocos=True)
+    with tempfile.TemporaryDirectory() as pasta:
+        salvar_resultados(pasta, cubo, df_teto, catalogo)
+        print(f"Cubo: {len(cubo):,} linhas | {os.path.getsize(os.path.join(pasta, 'cubo.parquet')) / 1e6:.1f} MB em Parquet")
+        referencia = None
+        for motor in motores_disponiveis():
+            cubo_motor, teto_motor, catalogo_motor, _ = carregar_resultados(pasta, motor=motor)
+            resultado = {**consultas(cubo_motor, teto_motor, catalogo_motor), **consultas_vazias(cubo_motor, teto_motor, catalogo_motor)}
+            if referencia is None:
+                referencia = resultado
+            else:
+                for nome, df in resultado.items():
+                    pd.testing.assert_frame_equal(normalizar(df), normalizar(referencia[nome]), check_dtype=False, obj=f"{motor}/{nome}")
+            tempo = min(timeit.repeat(lambda: consultas(cubo_motor, teto_motor, catalogo_motor), number=1, repeat=args.repeticoes))
+            print(f"{motor:8s} {tempo * 1000:9.1f} ms  {'(referência)' if resultado is referencia else '(resultados iguais ao pandas)'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""Gerador de arquivos PAPA e Espelho sintéticos, fiéis ao layout do SIA/SUS.
+
+Mesmos nomes de colunas do PAPA (61 colunas) e do Espelho de teto, encoding
+latin1, números no formato BR ("1.234,56"), mistura de naturezas jurídicas e
+variantes compactadas (zip com um ou vários meses, gzip, zstd). Um Espelho por
+ano coberto pelos meses, com tetos diferentes entre os anos. A escrita é feita
+em blocos, então é possível gerar milhões de linhas sem estourar a memória.
+
+Uso:
+    python benchmarks/dados_sinteticos.py --saida /tmp/sus_sintetico --meses 24 --linhas 1000000
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sys
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+try:
+    import zstandard
+except ImportError:  # Só a variante 'zstd' precisa dele.
+    zstandard = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from numeros_br import formatar_numeros_br  # noqa: E402
+
+COLUNAS_PAPA = (
+    'PA_CODUNI,PA_GESTAO,PA_CONDIC,PA_UFMUN,PA_REGCT,PA_INCOUT,PA_INCURG,PA_TPUPS,PA_TIPPRE,PA_MN_IND,'
+    'PA_CNPJCPF,PA_CNPJMNT,PA_CNPJ_CC,PA_MVM,PA_CMP,PA_PROC_ID,ULTIMO_DIGITO_PROC_ID,PA_TPFIN,PA_SUBFIN,'
+    'PA_NIVCPL,PA_DOCORIG,PA_AUTORIZ,PA_CNSMED,PA_CBOCOD,PA_MOTSAI,PA_OBITO,PA_ENCERR,PA_PERMAN,PA_ALTA,'
+    'PA_TRANSF,PA_CIDPRI,PA_CIDSEC,PA_CIDCAS,PA_CATEND,PA_IDADE,IDADEMIN,IDADEMAX,PA_FLIDADE,PA_SEXO,'
+    'PA_RACACOR,PA_MUNPCN,PA_QTDPRO,PA_QTDAPR,PA_VALPRO,PA_VALAPR,PA_UFDIF,PA_MNDIF,PA_DIF_VAL,NU_VPA_TOT,'
+    'NU_PA_TOT,PA_INDICA,PA_CODOCO,PA_FLQT,PA_FLER,PA_ETNIA,PA_VL_CF,PA_VL_CL,PA_VL_INC,PA_SRV_C,PA_INE,PA_NAT_JUR'
+).split(',')
+
+COLUNAS_ESPELHO = ['Financ', 'Procedim', 'Descrição', 'Fisico', 'Medio/Unit', 'Orçamentario', '% Incremento',
+                   'Valor Increm', 'Total Orçado', 'Apuração', 'Competência', 'Num_CNES', 'Nome_estabelecimento']
+
+# Valores fixos (iguais aos da amostra real) para as colunas que o dashboard não usa
+_FIXOS_PAPA = {
+    'PA_GESTAO': '150140', 'PA_CONDIC': 'PG', 'PA_UFMUN': '150140', 'PA_REGCT': '0000', 'PA_INCOUT': '0000',
+    'PA_INCURG': '0000', 'PA_TPUPS': '05', 'PA_TIPPRE': '00', 'PA_MN_IND': 'M', 'PA_CNPJCPF': '07917818000112',
+    'PA_CNPJMNT': '07917818000112', 'PA_CNPJ_CC': '00000000000000', 'PA_TPFIN': '06', 'PA_SUBFIN': '0000',
+    'PA_NIVCPL': '3', 'PA_DOCORIG': 'I', 'PA_AUTORIZ': '0000000000000', 'PA_CNSMED': '703008833925373',
+    'PA_CBOCOD': '225320', 'PA_MOTSAI': '00', 'PA_OBITO': '0', 'PA_ENCERR': '0', 'PA_PERMAN': '0', 'PA_ALTA': '0',
+    'PA_TRANSF': '0', 'PA_CIDPRI': '0000', 'PA_CIDSEC': '0000', 'PA_CIDCAS': '0000', 'PA_CATEND': '02',
+    'IDADEMIN': '0', 'IDADEMAX': '130', 'PA_FLIDADE': '1', 'PA_RACACOR': '03', 'PA_MUNPCN': '150140',
+    'PA_UFDIF': '0', 'PA_MNDIF': '0', 'PA_DIF_VAL': '0,0', 'NU_VPA_TOT': '0,0', 'PA_INDICA': '5', 'PA_CODOCO': '1',
+    'PA_FLQT': 'K', 'PA_FLER': '0', 'PA_ETNIA': '', 'PA_VL_CF': '0,0', 'PA_VL_CL': '0,0', 'PA_VL_INC': '0,0',
+    'PA_SRV_C': '', 'PA_INE': '',
+}
+
+# Naturezas jurídicas: a maior parte é 1031 (município), o resto é descartado pelo filtro
+NATUREZAS = ['1031', '1244', '2062', '3999']
+PESOS_NATUREZA = [0.85, 0.07, 0.05, 0.03]
+
+_TIPOS_UNIDADE = ['UPA', 'HOSPITAL MUNICIPAL', 'UNIDADE MUNICIPAL DE SAÚDE', 'UBS', 'ESF', 'CENTRO DE ESPECIALIDADES',
+                  'POLICLÍNICA', 'SANTA CASA', 'UMS', 'LABORATÓRIO']
+_BAIRROS = ['MARAMBAIA', 'JURUNAS', 'GUAMÁ', 'PEDREIRA', 'SACRAMENTA', 'TELÉGRAFO', 'CREMAÇÃO', 'ICOARACI',
+            'MOSQUEIRO', 'TERRA FIRME', 'CONDOR', 'BENGUÍ', 'MARCO', 'UMARIZAL', 'CANUDOS']
+
+
+def _sortear_distintos(rng, inicio, fim, n):
+    valores = np.unique(rng.integers(inicio, fim, n * 2))
+    return np.sort(rng.permutation(valores)[:n])
+
+
+def gerar_unidades(n_unidades, seed=0):
+    rng = np.random.default_rng(seed)
+    cnes = _sortear_distintos(rng, 10_000, 9_999_999, n_unidades)
+    nomes = [f"{_TIPOS_UNIDADE[i % len(_TIPOS_UNIDADE)]} {_BAIRROS[(i * 7) % len(_BAIRROS)]} {i // len(_BAIRROS) + 1}"
+             for i in range(n_unidades)]
+    return pd.DataFrame({'CNES': [str(c).zfill(7) for c in cnes], 'Nome': nomes})
+
+
+def gerar_procedimentos(n_procedimentos, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    codigos = _sortear_distintos(rng, 101_001_001, 899_999_999, n_procedimentos)
+    return pd.DataFrame({
+        'Codigo': [str(c).zfill(9) for c in codigos],
+        'Descricao': [f"PROCEDIMENTO SINTÉTICO {i:05d} EM ATENÇÃO ESPECIALIZADA" for i in range(n_procedimentos)],
+        'Valor_Unit': rng.choice([2.70, 1.85, 10.00, 97.44, 138.63, 6.35, 10.90, 55.00], size=n_procedimentos),
+    })
+
+
+def gerar_papa(caminho, competencia, unidades, procedimentos, linhas, seed=0, tamanho_bloco=250_000):
+    """Escreve um PAPA CSV (latin1) com `linhas` registros, em blocos."""
+    rng = np.random.default_rng(seed)
+    # Poucas unidades concentram a produção, como na amostra real
+    pesos_unid = rng.pareto(1.2, len(unidades)) + 0.01
+    pesos_unid /= pesos_unid.sum()
+    pesos_proc = rng.pareto(1.0, len(procedimentos)) + 0.01
+    pesos_proc /= pesos_proc.sum()
+
+    with open(caminho, 'w', encoding='latin1', newline='') as f:
+        f.write(','.join(COLUNAS_PAPA) + '\n')
+        for inicio in range(0, linhas, tamanho_bloco):
+            n = min(tamanho_bloco, linhas - inicio)
+            iu = rng.choice(len(unidades), size=n, p=pesos_unid)
+            ip = rng.choice(len(procedimentos), size=n, p=pesos_proc)
+            qtd = rng.choice([1, 1, 1, 1, 2, 3, 5, 10], size=n)
+            valor = procedimentos['Valor_Unit'].to_numpy()[ip] * qtd
+            bloco = pd.DataFrame({c: v for c, v in _FIXOS_PAPA.items()}, index=range(n))
+            bloco['PA_CODUNI'] = unidades['CNES'].to_numpy()[iu]
+            bloco['PA_MVM'] = competencia
+            bloco['PA_CMP'] = competencia
+            bloco['PA_PROC_ID'] = procedimentos['Codigo'].to_numpy()[ip]
+            bloco['ULTIMO_DIGITO_PROC_ID'] = rng.integers(0, 10, n).astype(str)
+            bloco['PA_IDADE'] = np.char.zfill(rng.integers(0, 100, n).astype(str), 3)
+            bloco['PA_SEXO'] = rng.choice(['M', 'F'], size=n)
+            bloco['PA_QTDPRO'] = qtd.astype(str)
+            bloco['PA_QTDAPR'] = qtd.astype(str)
+            bloco['PA_VALPRO'] = formatar_numeros_br(valor, milhar=False)
+            bloco['PA_VALAPR'] = bloco['PA_VALPRO']
+            bloco['NU_PA_TOT'] = bloco['PA_VALPRO']
+            bloco['PA_NAT_JUR'] = rng.choice(NATUREZAS, size=n, p=PESOS_NATUREZA)
+            bloco[COLUNAS_PAPA].to_csv(f, header=False, index=False)
+    return caminho
+
+
+def gerar_espelho(caminho, competencia, unidades, procedimentos, procs_por_unidade=40, seed=0):
+    """Escreve o Espelho de teto (latin1, valores com separador de milhar)."""
+    rng = np.random.default_rng(seed + 2)
+    n_proc = min(procs_por_unidade, len(procedimentos))
+    linhas = []
+    for cnes, nome in zip(unidades['CNES'], unidades['Nome']):
+        ip = rng.choice(len(procedimentos), size=n_proc, replace=False)
+        fisico = rng.integers(1, 2000, n_proc)
+        unit = procedimentos['Valor_Unit'].to_numpy()[ip]
+        linhas.append(pd.DataFrame({
+            'Financ': 'MAC', 'Procedim': procedimentos['Codigo'].to_numpy()[ip],
+            'Descrição': procedimentos['Descricao'].to_numpy()[ip], 'Fisico': fisico.astype(str),
+            'Medio/Unit': formatar_numeros_br(unit).to_numpy(), 'Orçamentario': formatar_numeros_br(fisico * unit).to_numpy(),
+            '% Incremento': '0,00', 'Valor Increm': '0,00', 'Total Orçado': formatar_numeros_br(fisico * unit).to_numpy(),
+            'Apuração': 'Proced.', 'Competência': competencia, 'Num_CNES': cnes, 'Nome_estabelecimento': nome,
+        }))
+    pd.concat(linhas, ignore_index=True)[COLUNAS_ESPELHO].to_csv(caminho, index=False, encoding='latin1')
+    return caminho
+
+
+def compactar(caminhos, destino, formato):
+    """Gera a variante compactada: 'zip' (um ou vários membros), 'gzip' ou 'zstd' (um arquivo)."""
+    if formato == 'zip':
+        with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            for c in caminhos: zf.write(c, arcname=os.path.basename(c))
+    elif formato == 'gzip':
+        with open(caminhos[0], 'rb') as origem, gzip.open(destino, 'wb') as gz:
+            shutil.copyfileobj(origem, gz)
+    elif formato == 'zstd':
+        if zstandard is None:
+            raise ImportError("A variante 'zstd' exige o pacote 'zstandard' (pip install zstandard).")
+        with open(caminhos[0], 'rb') as origem, open(destino, 'wb') as saida:
+            zstandard.ZstdCompressor().copy_stream(origem, saida)
+    else:
+        raise ValueError(f"formato desconhecido: {formato}")
+    return destino
+
+
+def gerar_conjunto(pasta, meses=12, linhas_por_mes=100_000, n_unidades=150, n_procedimentos=400,
+                   ano=2025, uf='PA', variante='csv', seed=0):
+    """Gera pasta/papa e pasta/espelho no layout do processar_lote.py.
+
+    `variante`: 'csv' (um CSV por mês), 'zip' (um zip por mês), 'zip_multi'
+    (um único zip com todos os meses), 'gzip' (um .csv.gz por mês) ou 'zstd'
+    (um .csv.zst por mês). Os meses começam em jan/`ano`; cada ano coberto
+    ganha seu Espelho (competência AAAA01), com tetos diferentes.
+    Retorna (arquivos PAPA, arquivos Espelho).
+    """
+    pasta_papa, pasta_espelho = os.path.join(pasta, 'papa'), os.path.join(pasta, 'espelho')
+    os.makedirs(pasta_papa, exist_ok=True)
+    os.makedirs(pasta_espelho, exist_ok=True)
+    unidades = gerar_unidades(n_unidades, seed)
+    procedimentos = gerar_procedimentos(n_procedimentos, seed)
+
+    csvs = []
+    for m in range(1, meses + 1):
+        competencia = f"{ano + (m - 1) // 12}{(m - 1) % 12 + 1:02d}"
+        nome = f"PA{uf}{competencia[2:]}.csv"
+        csvs.append(gerar_papa(os.path.join(pasta_papa, nome), competencia, unidades, procedimentos, linhas_por_mes, seed + m))
+
+    if variante == 'zip_multi':
+        arquivos_papa = [compactar(csvs, os.path.join(pasta_papa, f"PAPA_{ano}.zip"), 'zip')]
+    elif variante in ('zip', 'gzip', 'zstd'):
+        ext = {'zip': '.zip', 'gzip': '.csv.gz', 'zstd': '.csv.zst'}[variante]
+        arquivos_papa = [compactar([c], c.replace('.csv', ext), variante) for c in csvs]
+    else:
+        arquivos_papa = csvs
+    if variante != 'csv':
+        for c in csvs: os.remove(c)
+
+    anos = range(ano, ano + (meses - 1) // 12 + 1)
+    espelhos = [gerar_espelho(os.path.join(pasta_espelho, f"espelho_teto_{a}.csv"), f"{a}01", unidades, procedimentos,
+                              seed=seed + 10 * (a - ano))
+                for a in anos]
+    return arquivos_papa, espelhos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--saida', required=True)
+    parser.add_argument('--meses', type=int, default=12)
+    parser.add_argument('--linhas', type=int, default=100_000, help="linhas por mês")
+    parser.add_argument('--unidades', type=int, default=150)
+    parser.add_argument('--procedimentos', type=int, default=400)
+    parser.add_argument('--variante', choices=['csv', 'zip', 'zip_multi', 'gzip', 'zstd'], default='csv')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    papa, espelho = gerar_conjunto(args.saida, args.meses, args.linhas, args.unidades, args.procedimentos,
+                                   variante=args.variante, seed=args.seed)
+    for f in papa + espelho:
+        print(f"{f}  ({os.path.getsize(f) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
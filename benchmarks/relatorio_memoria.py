@@ -0,0 +1,87 @@
+"""Relatório de memória do PAPA: bytes por linha antes e depois dos tipos compactos.
+
+Na versão compacta as chaves que se repetem muito (CNES, competência,
+procedimento) viram `category`, as contagens viram int32 e as colunas que o
+dashboard não usa são descartadas. O valor aprovado continua em float64: em
+float32 o total de janeiro da amostra já desvia alguns centavos. Serve só de
+comparação: o dashboard guarda o PAPA já agregado em parciais mensais.
+
+Uso:
+    python benchmarks/relatorio_memoria.py [arquivo_papa]
+
+Sem argumento usa o papa_janeiro.csv (zip) da raiz do repositório.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from compactados import abrir_membro, listar_membros  # noqa: E402
+from ingestao import ler_csv_sus, parse_arquivo_papa  # noqa: E402
+from cubo import construir_cubo  # noqa: E402
+
+COLUNAS_CHAVE = ['CNES_KEY', 'COMPETENCIA', 'PA_PROC_ID']
+# Medidas por linha e o tipo compacto usado para cada uma
+COLUNAS_MEDIDA = {'PA_VALAPR': np.float64, 'PA_QTDAPR': np.int32, 'N_REGISTROS': np.int32}
+
+
+def compactar_papa(df):
+    """Mantém só as colunas usadas, com chaves categóricas e contagens em 32 bits."""
+    if df.empty:
+        return df
+    colunas = [c for c in COLUNAS_CHAVE + list(COLUNAS_MEDIDA) if c in df.columns]
+    compacto = df[colunas].copy()
+    for col in COLUNAS_CHAVE:
+        if col in compacto.columns:
+            compacto[col] = compacto[col].astype(str).str.strip().astype('category')
+    for col, tipo in COLUNAS_MEDIDA.items():
+        if col in compacto.columns:
+            compacto[col] = pd.to_numeric(compacto[col], errors='coerce').fillna(0).astype(tipo)
+    return compacto.reset_index(drop=True)
+
+
+def parse_arquivo_papa_compacto(file):
+    """PAPA já filtrado (natureza jurídica 1031) e em tipos compactos."""
+    df_temp = parse_arquivo_papa(file)
+    if 'PA_NAT_JUR' in df_temp.columns:
+        df_temp = df_temp[df_temp['PA_NAT_JUR'] == '1031']
+    return compactar_papa(df_temp)
+
+
+def relatorio_memoria(etapas):
+    """Tabela de uso de memória para uma sequência de (nome da etapa, DataFrame)."""
+    linhas = []
+    for nome, df in etapas:
+        total = int(df.memory_usage(deep=True).sum())
+        linhas.append({'Etapa': nome, 'Linhas': len(df), 'Colunas': df.shape[1],
+                       'MB': total / 1e6, 'Bytes/linha': total / max(len(df), 1)})
+    return pd.DataFrame(linhas)
+
+
+def main():
+    caminho = sys.argv[1] if len(sys.argv) > 1 else os.path.join(RAIZ, 'papa_janeiro.csv')
+    membro = listar_membros(caminho)[0]
+
+    with abrir_membro(membro) as f: texto = ler_csv_sus(f)
+    with abrir_membro(membro) as f: tipado = parse_arquivo_papa(f)
+    with abrir_membro(membro) as f: compacto = parse_arquivo_papa_compacto(f)
+    cubo = construir_cubo(compacto, pd.DataFrame())
+
+    rel = relatorio_memoria([
+        ('Texto (dtype=str, todas as colunas)', texto),
+        ('Tipado (parse_arquivo_papa)', tipado),
+        ('Compacto (categorias + int32)', compacto),
+        ('Cubo agregado', cubo),
+    ])
+    print(f"Arquivo: {membro.nome}")
+    print(rel.to_string(index=False, float_format=lambda v: f"{v:,.1f}"))
+    ganho = rel['Bytes/linha'].iloc[0] / rel['Bytes/linha'].iloc[2]
+    print(f"\nBytes/linha: {rel['Bytes/linha'].iloc[0]:,.0f} -> {rel['Bytes/linha'].iloc[2]:,.0f} ({ganho:.0f}x menor)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""Suíte de benchmarks do dashboard com dados sintéticos em escala realista.
+
+Gera (ou reaproveita) um conjunto PAPA/Espelho com dados_sinteticos.py e mede
+cada etapa: ingestão (cache frio e quente, CSV e zip, leitura completa e em
+blocos, CSV/zip/zstd), consolidação com teto de vários anos, troca de filtro e
+as consultas de cada aba. Para cada cenário reporta tempo, vazão (linhas/s e
+MB/s) e memória. O RSS do processo é amostrado durante o cenário (inclui os
+buffers do Arrow, que o tracemalloc não vê): `rss_pico_mb` é o maior RSS
+durante o cenário e `memoria_pico_mb` quanto ele subiu acima do RSS do início.
+Antes de cada cenário a memória livre é devolvida ao sistema (gc, pool do Arrow
+e malloc_trim da glibc), para o ponto de partida não esconder o pico.
+
+Uso:
+    python benchmarks/suite.py --meses 12 --linhas 500000
+    python benchmarks/suite.py --json resultado.json
+    python benchmarks/suite.py --comparar base.json --tolerancia 0.25 --tolerancia-memoria 0.25
+
+Com `--comparar`, termina com código 1 se algum cenário ficar mais lento ou
+usar mais memória que a referência além da tolerância: dá para rodar antes do
+deploy.
+"""
+import argparse
+import ctypes
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# O cache colunar precisa apontar para uma pasta descartável antes dos imports do app
+_DIR_CACHE_BENCH = tempfile.mkdtemp(prefix='sus_bench_cache_')
+os.environ['SUS_CACHE_DIR'] = _DIR_CACHE_BENCH
+
+import pandas as pd  # noqa: E402
+import pyarrow as pa  # noqa: E402
+
+from cache_colunar import limpar_cache  # noqa: E402
+from cubo import cnes_disponiveis, competencias_disponiveis, fatiar  # noqa: E402
+from dados_sinteticos import gerar_conjunto  # noqa: E402
+from exportacao import FORMATOS, exportar, tabelas_exportacao  # noqa: E402
+from instrumentacao import memoria_rss_mb  # noqa: E402
+from motor import calcular_timeline, calcular_top_procedimentos, carregar_dados, consolidar_periodo  # noqa: E402
+from tabela_detalhada import filtrar_ordenar, recortar_pagina  # noqa: E402
+
+
+try:
+    _LIBC = ctypes.CDLL("libc.so.6")
+except OSError:  # Fora da glibc não há malloc_trim.
+    _LIBC = None
+
+INTERVALO_AMOSTRA = 0.005
+# Diferenças de memória abaixo disso são ruído do alocador, não regressão
+PISO_MEMORIA_MB = 16
+
+
+def devolver_memoria():
+    """Devolve ao sistema a memória já liberada, para o RSS de partida ser o real."""
+    gc.collect()
+    pa.default_memory_pool().release_unused()
+    if _LIBC is not None:
+        _LIBC.malloc_trim(0)
+
+
+class AmostradorRSS(threading.Thread):
+    """Lê o RSS do processo a cada INTERVALO_AMOSTRA enquanto o cenário roda e guarda o maior."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.pico = memoria_rss_mb()
+        self._parar = threading.Event()
+
+    def amostrar(self):
+        rss = memoria_rss_mb()
+        if rss is not None and (self.pico is None or rss > self.pico):
+            self.pico = rss
+
+    def run(self):
+        while not self._parar.wait(INTERVALO_AMOSTRA):
+            self.amostrar()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *erro):
+        self._parar.set()
+        self.join()
+        self.amostrar()
+
+
+def medir(nome, funcao, linhas=0, bytes_lidos=0, repeticoes=1):
+    """Executa `funcao` e devolve (resultado, métricas). Usa o menor tempo das repetições."""
+    tempos = []
+    devolver_memoria()
+    inicio_rss = memoria_rss_mb()
+    with AmostradorRSS() as amostra:
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            resultado = funcao()
+            tempos.append(time.perf_counter() - inicio)
+    segundos = min(tempos)
+    metricas = {
+        'cenario': nome,
+        'segundos': round(segundos, 4),
+        'linhas': int(linhas),
+        'linhas_por_s': round(linhas / segundos) if linhas and segundos else None,
+        'mb_por_s': round(bytes_lidos / 1e6 / segundos, 1) if bytes_lidos and segundos else None,
+        'rss_pico_mb': round(amostra.pico, 1) if amostra.pico is not None else None,
+        'memoria_pico_mb': round(amostra.pico - inicio_rss, 1) if amostra.pico is not None and inicio_rss is not None else None,
+    }
+    return resultado, metricas
+
+
+def contar_linhas(arquivos):
+    # Linhas do CSV descompactado, sem o cabeçalho
+    from compactados import abrir_membro, listar_membros
+    total = 0
+    for arq in arquivos:
+        for membro in listar_membros(arq):
+            with abrir_membro(membro) as f:
+                total += sum(1 for _ in f) - 1
+    return total
+
+
+def rodar_cenarios(pasta, args):
+    resultados = []
+    conjuntos = {}
+    for variante in args.variantes:
+        destino = os.path.join(pasta, variante)
+        papa, espelho = gerar_conjunto(destino, args.meses, args.linhas, args.unidades, args.procedimentos,
+                                       variante=variante, seed=args.seed)
+        conjuntos[variante] = (papa, espelho, sum(os.path.getsize(f) for f in papa + espelho))
+    linhas_papa = contar_linhas(conjuntos[args.variantes[0]][0])
+
+    # --- INGESTÃO ---
+    modos = {'completa': {}, 'blocos': {'leitura_em_blocos': True}}
+    for variante, (papa, espelho, tamanho) in conjuntos.items():
+        for modo, opcoes in modos.items():
+            limpar_cache()
+            for estado in ('frio', 'quente'):
+                carga, m = medir(f"ingestao/{variante}/{modo}/{estado}",
+                                 lambda: carregar_dados(papa, espelho, workers=args.workers, **opcoes),
+                                 linhas=linhas_papa, bytes_lidos=tamanho)
+                resultados.append(m)
+
+    cubo, df_teto, catalogo, _ = carregar_dados(*conjuntos[args.variantes[0]][:2], workers=args.workers)
+    meses = competencias_disponiveis(cubo)
+    r = args.repeticoes
+
+    # --- CONSOLIDAÇÃO E FILTROS ---
+    _, m = medir('consolidacao/periodo_completo', lambda: consolidar_periodo(cubo, df_teto, meses), len(cubo), repeticoes=r)
+    resultados.append(m)
+    _, m = medir('filtro/troca_de_mes', lambda: [consolidar_periodo(cubo, df_teto, [mes]) for mes in meses],
+                 len(cubo) * len(meses), repeticoes=r)
+    resultados.append(m)
+    df = consolidar_periodo(cubo, df_teto, meses)
+    categorias = list(df['Categoria'].unique())
+    _, m = medir('filtro/categoria', lambda: [df[df['Categoria'] == c] for c in categorias], len(df), repeticoes=r)
+    resultados.append(m)
+
+    # --- ABAS ---
+    cubo_periodo = fatiar(cubo, competencias=meses)
+    unidade = cnes_disponiveis(cubo)[:1]
+    _, m = medir('aba/visao_geral', lambda: df.sort_values('Valor_Teto', ascending=False).head(10), len(df), repeticoes=r)
+    resultados.append(m)
+    _, m = medir('aba/evolucao', lambda: calcular_timeline(cubo_periodo), len(cubo_periodo), repeticoes=r)
+    resultados.append(m)
+    _, m = medir('aba/evolucao_anual', lambda: calcular_timeline(cubo_periodo, por_ano=True), len(cubo_periodo), repeticoes=r)
+    resultados.append(m)
+    _, m = medir('aba/evolucao_unidade', lambda: calcular_timeline(cubo_periodo, cnes=unidade), len(cubo_periodo), repeticoes=r)
+    resultados.append(m)
+    _, m = medir('aba/top_procedimentos', lambda: calcular_top_procedimentos(cubo_periodo, catalogo),
+                 len(cubo_periodo), repeticoes=r)
+    resultados.append(m)
+    _, m = medir('aba/dados_detalhados',
+                 lambda: recortar_pagina(filtrar_ordenar(df, 'UPA', '% Execucao', False), 1, 50), len(df), repeticoes=r)
+    resultados.append(m)
+    _, m = medir('aba/mapeamento_cnes', lambda: df[['CNES_KEY', 'Unidade', 'Categoria']].drop_duplicates(), len(df), repeticoes=r)
+    resultados.append(m)
+
+    # --- EXPORTAÇÃO ---
+    tabelas, m = medir('exportacao/tabelas', lambda: tabelas_exportacao(df, cubo_periodo, catalogo), len(cubo_periodo), repeticoes=r)
+    resultados.append(m)
+    for formato in FORMATOS:
+        destino = os.path.join(pasta, f"exportacao.{formato.lower()}")
+        _, m = medir(f"exportacao/{formato.lower()}", lambda: exportar(tabelas, formato, destino), sum(map(len, tabelas.values())), repeticoes=r)
+        resultados.append(m)
+    return resultados
+
+
+def comparar(resultados, referencia, tolerancia, tolerancia_memoria=0.25):
+    """Cenários mais lentos ou que usam mais memória que a referência além da tolerância (fração, 0.25 = 25%).
+
+    Devolve (cenário, métrica, valor anterior, valor atual).
+    """
+    base = {c['cenario']: c for c in referencia['cenarios']}
+    regressoes = []
+    for c in resultados:
+        anterior = base.get(c['cenario'])
+        if not anterior:
+            continue
+        # Cenários abaixo de 10 ms oscilam demais para servir de alerta
+        if max(anterior['segundos'], c['segundos']) >= 0.01 and c['segundos'] > anterior['segundos'] * (1 + tolerancia):
+            regressoes.append((c['cenario'], 'segundos', anterior['segundos'], c['segundos']))
+        memoria_antes, memoria = anterior.get('memoria_pico_mb'), c.get('memoria_pico_mb')
+        if memoria_antes is None or memoria is None:
+            continue
+        if memoria - memoria_antes >= PISO_MEMORIA_MB and memoria > max(memoria_antes, 0) * (1 + tolerancia_memoria):
+            regressoes.append((c['cenario'], 'memoria_pico_mb', memoria_antes, memoria))
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--meses', type=int, default=18, help="a partir de jan; mais de 12 gera um Espelho por ano")
+    parser.add_argument('--linhas', type=int, default=100_000, help="linhas PAPA por mês")
+    parser.add_argument('--unidades', type=int, default=150)
+    parser.add_argument('--procedimentos', type=int, default=400)
+    parser.add_argument('--variantes', nargs='+', default=['csv', 'zip_multi', 'zstd'],
+                        choices=['csv', 'zip', 'zip_multi', 'gzip', 'zstd'])
+    parser.add_argument('--workers', type=int, default=1,
+                        help="com mais de 1, a memória dos processos filhos fica fora das medidas")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dados', help="pasta para os dados gerados (padrão: temporária)")
+    parser.add_argument('--json', help="grava os resultados neste arquivo")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="folga de tempo (fração)")
+    parser.add_argument('--tolerancia-memoria', type=float, default=0.25,
+                        help=f"folga de memoria_pico_mb (fração; diferenças abaixo de {PISO_MEMORIA_MB} MB são ignoradas)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='sus_bench_') as temp:
+        resultados = rodar_cenarios(args.dados or temp, args)
+
+    tabela = pd.DataFrame(resultados).set_index('cenario')
+    with pd.option_context('display.width', 200, 'display.max_rows', None):
+        print(tabela.to_string())
+
+    saida = {
+        'parametros': {k: v for k, v in vars(args).items() if k not in ('json', 'comparar', 'dados')},
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'cenarios': resultados,
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(saida, f, ensure_ascii=False, indent=2)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            regressoes = comparar(resultados, json.load(f), args.tolerancia, args.tolerancia_memoria)
+        for cenario, metrica, anterior, atual in regressoes:
+            unidade = 's' if metrica == 'segundos' else ' MB'
+            print(f"REGRESSÃO {cenario} ({metrica}): {anterior:.3f}{unidade} -> {atual:.3f}{unidade}")
+        if regressoes:
+            sys.exit(1)
+        print("Sem regressões acima da tolerância.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Cache colunar em disco (Parquet) para os arquivos de entrada do dashboard.
+
+Cada arquivo enviado é identificado pelo hash SHA-256 do seu conteúdo. Na
+primeira leitura o CSV é interpretado normalmente e o resultado tipado é salvo
+em Parquet; nas leituras seguintes as colunas são abertas via memory-map, sem
+passar de novo pelo parser de CSV.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+import pyarrow.parquet as pq
+
+# Incrementar quando o formato dos dados salvos mudar (invalida o cache antigo).
+VERSAO_CACHE = "3"
+DIR_CACHE = os.environ.get("SUS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache_sus"))
+TAMANHO_BLOCO = 1 << 20
+
+
+def cache_disponivel():
+    return os.environ.get("SUS_CACHE_DESATIVADO", "") not in ("1", "true", "TRUE")
+
+
+def hash_conteudo(file):
+    """Calcula o SHA-256 do conteúdo do arquivo (UploadedFile, buffer ou caminho)."""
+    h = hashlib.sha256()
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b''):
+                h.update(bloco)
+        return h.hexdigest()
+    file.seek(0)
+    for bloco in iter(lambda: file.read(TAMANHO_BLOCO), b''):
+        h.update(bloco)
+    file.seek(0)
+    return h.hexdigest()
+
+
+def caminho_cache(tipo, chave):
+    return os.path.join(DIR_CACHE, f"v{VERSAO_CACHE}", tipo, f"{chave}.parquet")
+
+
+def em_cache(tipo, chave):
+    """Indica se (tipo, chave) já tem Parquet gravado, sem abrir o arquivo."""
+    return cache_disponivel() and os.path.exists(caminho_cache(tipo, chave))
+
+
+def gravar_parquet(df, destino, index=False):
+    """Grava de forma atômica (arquivo temporário + rename) para não deixar cache corrompido."""
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp, engine="pyarrow", index=index)
+        os.replace(tmp, destino)
+    except Exception:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+
+
+def ler_com_cache(file, tipo, parser, chave=None):
+    """Retorna o DataFrame tipado de `file`, usando o cache Parquet quando possível.
+
+    `tipo` separa os caches ('papa', 'espelho') e `parser` é a função que lê o
+    arquivo original quando ele ainda não está em cache. `chave` substitui o
+    hash do conteúdo quando ele já é conhecido (ex.: membros de um zip).
+    """
+    if not cache_disponivel():
+        return parser(file)
+
+    destino = caminho_cache(tipo, chave or hash_conteudo(file))
+    if os.path.exists(destino):
+        try:
+            return pq.read_table(destino, memory_map=True).to_pandas()
+        except Exception:
+            # Arquivo de cache ilegível: descarta e lê de novo o original.
+            os.remove(destino)
+
+    df = parser(file)
+    try:
+        gravar_parquet(df, destino)
+    except Exception:
+        pass  # Falha ao gravar o cache não deve impedir o carregamento.
+    return df
+
+
+def limpar_cache():
+    """Remove todos os arquivos de cache gravados em disco."""
+    if os.path.isdir(DIR_CACHE):
+        shutil.rmtree(DIR_CACHE)
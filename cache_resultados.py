@@ -0,0 +1,103 @@
+"""Cache em memória, compartilhado entre sessões, das visões derivadas do dashboard.
+
+As visões (consolidado do período, recorte por categoria/unidade, dados de
+cada aba) são guardadas pela chave (versão do conjunto de dados, estado de
+filtros normalizado, nome da visão). Várias pessoas olhando o mesmo conjunto
+com os mesmos filtros recebem o resultado já pronto. O cache é limitado em
+quantidade de entradas e em memória estimada; quando passa do limite, sai a
+entrada usada há mais tempo (LRU).
+
+Configuração:
+    SUS_CACHE_RESULTADOS_MB        limite de memória estimada (padrão 256)
+    SUS_CACHE_RESULTADOS_ENTRADAS  limite de entradas (padrão 512)
+
+Os valores devolvidos são compartilhados: quem recebe não deve alterá-los.
+"""
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+LIMITE_MB_PADRAO = float(os.environ.get("SUS_CACHE_RESULTADOS_MB", "256") or 256)
+LIMITE_ENTRADAS_PADRAO = int(os.environ.get("SUS_CACHE_RESULTADOS_ENTRADAS", "512") or 512)
+
+
+def normalizar_filtros(competencias=None, categorias=None, unidades=None, **extras):
+    """Estado de filtros como chave estável: a ordem da seleção não importa."""
+    estado = (tuple(sorted(map(str, competencias or []))), tuple(sorted(map(str, categorias or []))), tuple(sorted(map(str, unidades or []))))
+    return estado + tuple(sorted(extras.items()))
+
+
+def tamanho_aproximado(valor):
+    """Bytes aproximados de um resultado (DataFrame, Series, figura, tupla...)."""
+    if valor is None:
+        return 0
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, (tuple, list)):
+        return sum(tamanho_aproximado(v) for v in valor)
+    try:
+        return len(pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(valor)
+
+
+class CacheResultados:
+    """LRU limitado por entradas e por memória, seguro para várias threads (sessões)."""
+
+    def __init__(self, limite_mb=LIMITE_MB_PADRAO, limite_entradas=LIMITE_ENTRADAS_PADRAO):
+        self.limite_bytes = int(limite_mb * 1e6)
+        self.limite_entradas = limite_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = self.falhas = self.descartes = 0
+        self.bytes = 0
+
+    def obter(self, versao, estado, nome, calcular):
+        """Devolve a visão `nome` para (versao, estado), calculando só na primeira vez."""
+        chave = (versao, estado, nome)
+        with self._lock:
+            if chave in self._entradas:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return self._entradas[chave][0]
+            self.falhas += 1
+        # Calcula fora do lock para não travar as outras sessões; se duas calcularem juntas, vale a última
+        valor = calcular()
+        tamanho = tamanho_aproximado(valor)
+        if tamanho > self.limite_bytes:
+            return valor
+        with self._lock:
+            if chave in self._entradas:
+                self.bytes -= self._entradas.pop(chave)[1]
+            self._entradas[chave] = (valor, tamanho)
+            self.bytes += tamanho
+            while self._entradas and (len(self._entradas) > self.limite_entradas or self.bytes > self.limite_bytes):
+                _, (_, tamanho_antigo) = self._entradas.popitem(last=False)
+                self.bytes -= tamanho_antigo
+                self.descartes += 1
+        return valor
+
+    def limpar(self):
+        """Descarta todas as visões (botão do painel de administração); os contadores continuam."""
+        with self._lock:
+            self._entradas.clear()
+            self.bytes = 0
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                'entradas': len(self._entradas),
+                'memoria_mb': round(self.bytes / 1e6, 1),
+                'limite_mb': round(self.limite_bytes / 1e6, 1),
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'descartes': self.descartes,
+                'taxa_acerto': round(self.acertos / consultas, 3) if consultas else None,
+            }
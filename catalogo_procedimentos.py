@@ -0,0 +1,162 @@
+"""Catálogo indexado de procedimentos (SIGTAP): código -> descrição.
+
+Cada procedimento é guardado uma única vez, sob uma chave canônica inteira
+(os dígitos do código, sem zeros à esquerda). Assim '010101002',
+'0010101002' e '10101002' caem na mesma linha, e nomear uma Series inteira
+de códigos é um único `map` em vez de uma busca em Python por linha.
+O catálogo é gravado em Parquet junto do cache colunar e reaproveitado entre
+sessões: cada catálogo lido vira um arquivo próprio (marca de tempo e hash do
+conteúdo) em PASTA_CATALOGOS, e o persistido é a mescla de todos. Nenhuma carga reescreve
+o arquivo de outra, então cargas em paralelo (processar_lote.py) não perdem
+atualizações.
+"""
+import hashlib
+import os
+import time
+
+import pandas as pd
+
+from cache_colunar import DIR_CACHE, cache_disponivel, gravar_parquet
+from consolidacao import normalizar_texto
+
+PASTA_CATALOGOS = os.path.join(DIR_CACHE, "catalogos")
+# Acima disso os arquivos são mesclados num só na próxima leitura
+MAX_ARQUIVOS_CATALOGO = 64
+
+
+def catalogo_vazio():
+    return pd.DataFrame({'Procedimento': pd.Series([], dtype=object)}, index=pd.Index([], dtype='Int64', name='CODIGO'))
+
+
+def chave_sigtap(codigos):
+    """Chave canônica (Int64) a partir de códigos em qualquer formato; <NA> quando não há dígitos."""
+    digitos = pd.Series(codigos).astype(str).str.replace(r'\D', '', regex=True)
+    return pd.to_numeric(digitos.where(digitos != ''), errors='coerce').astype('Int64')
+
+
+def _colunas_codigo_descricao(columns):
+    headers_norm = [normalizar_texto(c) for c in columns]
+    col_cod = next((columns[i] for i, h in enumerate(headers_norm) if 'PROC_ID' in h or 'PROCEDIM' in h or ('COD' in h and 'PROC' in h)), None)
+    col_desc = next((columns[i] for i, h in enumerate(headers_norm) if 'DESCR' in h or ('NOME' in h and 'PROC' in h) or 'DS_PROC' in h), None)
+    return col_cod, col_desc
+
+
+def extrair_catalogo(df):
+    """Monta o catálogo a partir das colunas de código e descrição de um PAPA/Espelho."""
+    col_cod, col_desc = _colunas_codigo_descricao(list(df.columns))
+    if col_cod is None or col_desc is None:
+        return catalogo_vazio()
+    temp = df[[col_cod, col_desc]].dropna().drop_duplicates()
+    temp = pd.DataFrame({
+        'CODIGO': chave_sigtap(temp[col_cod]).to_numpy(),
+        'Procedimento': temp[col_desc].astype(str).str.strip().str.upper().to_numpy(),
+    }).dropna(subset=['CODIGO'])
+    # Na dúvida vale a última descrição lida, como no dicionário antigo
+    return temp.drop_duplicates('CODIGO', keep='last').set_index('CODIGO')
+
+
+def mesclar_catalogos(*catalogos):
+    """Junta catálogos; em códigos repetidos prevalece o catálogo mais à direita."""
+    catalogos = [c for c in catalogos if c is not None and not c.empty]
+    if not catalogos:
+        return catalogo_vazio()
+    juntos = pd.concat(catalogos)
+    return juntos[~juntos.index.duplicated(keep='last')].sort_index()
+
+
+def nomear_procedimentos(catalogo, codigos):
+    """Descrição de cada código da Series (com 'Proc. <código>' quando não catalogado)."""
+    codigos = pd.Series(codigos)
+    nomes = chave_sigtap(codigos).map(catalogo['Procedimento'])
+    return nomes.fillna('Proc. ' + codigos.astype(str)).astype(str).set_axis(codigos.index)
+
+
+def _arquivos_catalogo():
+    """Arquivos do catálogo persistido, do gravado primeiro ao último (o nome começa pela marca de tempo)."""
+    try:
+        return sorted(n for n in os.listdir(PASTA_CATALOGOS) if n.endswith('.parquet'))
+    except OSError:
+        return []
+
+
+def _ler_catalogos(arquivos):
+    catalogos = []
+    for nome in arquivos:
+        cat = pd.read_parquet(os.path.join(PASTA_CATALOGOS, nome))
+        cat.index = cat.index.astype('Int64')
+        catalogos.append(cat)
+    return catalogos
+
+
+def _compactar(arquivos, catalogo):
+    """Troca os arquivos lidos por um só com a mescla deles.
+
+    O arquivo novo leva a marca do mais recente dos lidos, para continuar
+    perdendo para os gravados depois da leitura, e só os arquivos lidos são
+    apagados: o que outra carga gravou enquanto isso fica.
+    """
+    destino = salvar_catalogo(catalogo, marca=int(arquivos[-1].split('_')[0]))
+    if destino is None:
+        return
+    for nome in arquivos:
+        caminho = os.path.join(PASTA_CATALOGOS, nome)
+        if caminho != destino:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+
+def carregar_catalogo_persistido():
+    """Mescla dos catálogos gravados; em códigos repetidos vale o arquivo gravado por último."""
+    if not cache_disponivel():
+        return catalogo_vazio()
+    for _ in range(3):
+        arquivos = _arquivos_catalogo()
+        try:
+            catalogos = _ler_catalogos(arquivos)
+            break
+        except FileNotFoundError:
+            continue  # Uma compactação apagou um arquivo entre a listagem e a leitura
+        except Exception:
+            return catalogo_vazio()
+    else:
+        return catalogo_vazio()
+    catalogo = mesclar_catalogos(*catalogos)
+    if len(arquivos) > MAX_ARQUIVOS_CATALOGO:
+        try:
+            _compactar(arquivos, catalogo)
+        except Exception:
+            pass
+    return catalogo
+
+
+def salvar_catalogo(catalogo, marca=None):
+    """Grava o catálogo no seu próprio arquivo e devolve o caminho (falha de gravação é ignorada).
+
+    O nome é "<marca de tempo>_<hash do conteúdo>". Se o mesmo conteúdo já está
+    gravado, o arquivo só ganha marca nova: na dúvida vale a última descrição lida.
+    """
+    if not cache_disponivel() or catalogo.empty:
+        return None
+    try:
+        chave = hashlib.sha256(pd.util.hash_pandas_object(catalogo, index=True).to_numpy().tobytes()).hexdigest()[:24]
+        destino = os.path.join(PASTA_CATALOGOS, f"{marca or time.time_ns():020d}_{chave}.parquet")
+        anteriores = [n for n in _arquivos_catalogo() if n.endswith(f"_{chave}.parquet")]
+        if anteriores and marca is None:
+            try:
+                os.replace(os.path.join(PASTA_CATALOGOS, anteriores[-1]), destino)
+                return destino
+            except OSError:
+                pass  # Apagado por uma compactação: grava de novo
+        gravar_parquet(catalogo, destino, index=True)
+        return destino
+    except Exception:
+        return None
+
+
+def atualizar_catalogo(*catalogos_novos):
+    """Grava os catálogos novos e devolve a mescla de todos os persistidos com eles."""
+    novos = mesclar_catalogos(*catalogos_novos)
+    salvar_catalogo(novos)
+    return mesclar_catalogos(carregar_catalogo_persistido(), novos)
@@ -0,0 +1,164 @@
+"""Suporte a arquivos compactados (zip, gzip, zstd) na leitura do PAPA/Espelho.
+
+O DATASUS distribui o PAPA compactado, às vezes com vários meses no mesmo
+zip. Cada membro é aberto como stream e descompactado aos poucos, conforme o
+parser consome os dados, sem descompactar o arquivo inteiro na memória.
+"""
+import gzip
+import io
+import os
+import re
+import zipfile
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+
+try:
+    import zstandard
+except ImportError:  # zstd é opcional: só é exigido quando um arquivo .zst é enviado.
+    zstandard = None
+
+# Assinaturas (magic numbers) dos formatos suportados
+_ASSINATURAS = (
+    (b'PK\x03\x04', 'zip'),
+    (b'\x1f\x8b', 'gzip'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+)
+EXTENSOES_COMPACTADAS = ('.zip', '.gz', '.gzip', '.zst', '.zstd')
+TAMANHO_INICIO = 1 << 16
+
+# Nome DATASUS: PA + UF + AAMM (ex.: PAPA2501 -> Pará, jan/2025)
+_PADRAO_COMPETENCIA = re.compile(r'PA[A-Z]{2}(\d{2})(\d{2})')
+
+Membro = namedtuple('Membro', ['nome', 'origem', 'formato', 'interno'])
+Membro.__doc__ = "Um arquivo de dados lógico: o próprio upload ou um membro de um arquivo compactado."
+
+
+def competencia_por_nome(nome):
+    """Extrai a competência 'AAAAMM' de nomes no padrão DATASUS (PAPA2501 -> '202501')."""
+    achado = _PADRAO_COMPETENCIA.search(os.path.basename(str(nome)).upper())
+    if not achado: return None
+    ano, mes = achado.groups()
+    if not 1 <= int(mes) <= 12: return None
+    return f"20{ano}{mes}"
+
+
+def nome_origem(origem):
+    return os.fspath(origem) if isinstance(origem, (str, os.PathLike)) else getattr(origem, 'name', '')
+
+
+def _bytes_iniciais(origem, n=4):
+    if isinstance(origem, (str, os.PathLike)):
+        with open(origem, 'rb') as f: return f.read(n)
+    origem.seek(0)
+    inicio = origem.read(n)
+    origem.seek(0)
+    return inicio
+
+
+def detectar_formato(origem):
+    """Identifica o formato pelo conteúdo (e não pela extensão, que costuma vir errada)."""
+    inicio = _bytes_iniciais(origem)
+    for assinatura, formato in _ASSINATURAS:
+        if inicio.startswith(assinatura): return formato
+    return 'csv'
+
+
+def _abrir_origem(origem):
+    """Abre uma visão independente da origem, para uso seguro em várias threads."""
+    if isinstance(origem, (str, os.PathLike)):
+        return open(origem, 'rb')
+    # getvalue() não copia os bytes em memória; cada leitor ganha a sua posição.
+    return io.BytesIO(origem.getvalue()) if hasattr(origem, 'getvalue') else origem
+
+
+def _sem_extensao_compactada(nome):
+    base = os.path.basename(nome)
+    for ext in EXTENSOES_COMPACTADAS:
+        if base.lower().endswith(ext): return base[:-len(ext)]
+    return base
+
+
+def listar_membros(origem):
+    """Lista os arquivos de dados contidos em `origem` (um por membro do zip)."""
+    formato = detectar_formato(origem)
+    nome = nome_origem(origem)
+    if formato == 'zip':
+        with _abrir_origem(origem) as bruto, zipfile.ZipFile(bruto) as zf:
+            internos = [i.filename for i in zf.infolist()
+                        if not i.is_dir() and not i.filename.startswith('__MACOSX/')]
+        return [Membro(os.path.basename(i), origem, formato, i) for i in sorted(internos)]
+    if formato in ('gzip', 'zstd'):
+        return [Membro(_sem_extensao_compactada(nome), origem, formato, None)]
+    return [Membro(os.path.basename(nome) or nome, origem, formato, None)]
+
+
+class _InicioRebobinavel(io.RawIOBase):
+    """Stream de leitura que permite voltar ao início enquanto só o começo foi lido.
+
+    Os streams de descompressão não voltam atrás de forma barata; guardar os
+    primeiros bytes basta para detectar o separador pelo cabeçalho.
+    """
+
+    def __init__(self, bruto, nome, tamanho_inicio=TAMANHO_INICIO):
+        super().__init__()
+        self._bruto = bruto
+        self._inicio = bruto.read(tamanho_inicio)
+        self._pos = 0
+        self.name = nome
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR and offset == 0:
+            return self._pos
+        if whence == io.SEEK_SET and self._pos <= len(self._inicio) and 0 <= offset <= len(self._inicio):
+            self._pos = offset
+            return self._pos
+        raise io.UnsupportedOperation("stream compactado só volta para dentro do trecho inicial")
+
+    def readinto(self, b):
+        if self._pos < len(self._inicio):
+            n = min(len(b), len(self._inicio) - self._pos)
+            b[:n] = self._inicio[self._pos:self._pos + n]
+        else:
+            dados = self._bruto.read(len(b))
+            n = len(dados)
+            b[:n] = dados
+        self._pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._bruto.close()
+        super().close()
+
+
+@contextmanager
+def abrir_membro(membro):
+    """Abre o membro como stream binário; os objetos intermediários são fechados ao sair."""
+    with ExitStack() as pilha:
+        if membro.formato == 'csv':
+            if isinstance(membro.origem, (str, os.PathLike)):
+                yield pilha.enter_context(open(membro.origem, 'rb'))
+            else:
+                membro.origem.seek(0)
+                yield membro.origem
+            return
+
+        base = pilha.enter_context(_abrir_origem(membro.origem))
+        if membro.formato == 'zip':
+            bruto = pilha.enter_context(zipfile.ZipFile(base)).open(membro.interno)
+        elif membro.formato == 'gzip':
+            bruto = gzip.GzipFile(fileobj=base, mode='rb')
+        else:
+            if zstandard is None:
+                raise ImportError("Arquivos .zst exigem o pacote 'zstandard' (pip install zstandard).")
+            bruto = zstandard.ZstdDecompressor().stream_reader(base)
+        yield pilha.enter_context(_InicioRebobinavel(bruto, membro.nome))
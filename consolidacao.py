@@ -0,0 +1,161 @@
+"""Consolidação Teto x Produção por unidade (CNES), totalmente vetorizada.
+
+Separado do app para poder ser usado (e medido) fora do Streamlit.
+"""
+import json
+import os
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Regras de categoria: vale a primeira com algum termo presente no nome (normalizado).
+# Podem ser trocadas sem mexer no código com SUS_REGRAS_CATEGORIA apontando para um JSON
+# no mesmo formato: {"🚨 UPA": ["UPA"], "🏥 HOSPITAL": ["HOSP", "SANTA CASA"], ...}.
+REGRAS_PADRAO = {
+    '🚨 UPA': ['UPA'],
+    '🏥 HOSPITAL': ['HOSP', 'SANTA CASA'],
+    '🩺 UMS': ['UMS'],
+    '💉 UBS': ['UBS'],
+    '👩‍⚕️ ESF': ['ESF'],
+    '🏢 CENTRO': ['CENTRO'],
+}
+CATEGORIA_OUTROS = '📍 OUTROS'
+ARQUIVO_REGRAS = os.environ.get("SUS_REGRAS_CATEGORIA", "")
+# Nomes já classificados ficam na memória do processo (reruns, sessões e conjuntos diferentes)
+MAX_NOMES_MEMORIZADOS = 200000
+# Abaixo disso (um município tem ~150 unidades) o custo fixo dos kernels do Arrow
+# supera a cadeia de `in` nome a nome, que é o caminho usado
+MIN_NOMES_ARROW = 512
+
+
+@lru_cache(maxsize=65536)
+def normalizar_texto(texto):
+    """Maiúsculas sem acento. Memorizado: cabeçalhos e nomes se repetem entre arquivos."""
+    if not isinstance(texto, str): return str(texto)
+    return unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('utf-8').upper()
+
+
+def _normalizar_arrow(textos):
+    """normalizar_texto com os kernels do Arrow, para um pa.Array de strings inteiro."""
+    if not pc.all(pc.string_is_ascii(textos)).as_py():
+        textos = pc.replace_substring_regex(pc.utf8_normalize(textos, 'NFKD'), r'[^\x00-\x7f]', '')
+    return pc.utf8_upper(textos)
+
+
+def _para_arrow(serie):
+    textos = pa.array(serie.astype('str').fillna(''), pa.string())
+    return textos.combine_chunks() if isinstance(textos, pa.ChunkedArray) else textos
+
+
+class ClassificadorUnidades:
+    """Regras de categoria compiladas e aplicadas à coluna de nomes distintos de uma vez.
+
+    Os termos de cada regra viram uma alternação ("HOSP|SANTA CASA"), testada
+    em todos os nomes por vez (kernel de regex do Arrow); vale a primeira regra
+    que casar, como na antiga cadeia de `if`. Os nomes já classificados ficam
+    memorizados e são reaproveitados entre reruns, sessões e conjuntos. Séries
+    com menos de MIN_NOMES_ARROW nomes seguem a cadeia de `if`, nome a nome.
+    """
+
+    def __init__(self, regras=None, outros=CATEGORIA_OUTROS):
+        regras = dict(regras if regras is not None else REGRAS_PADRAO)
+        self.categorias = [c for c, termos in regras.items() if termos]
+        self.termos = [[normalizar_texto(t) for t in regras[c]] for c in self.categorias]
+        self.padroes = ['|'.join(re.escape(normalizar_texto(t)) for t in regras[c]) for c in self.categorias]
+        self.outros = outros
+        self._rotulos = np.array(self.categorias + [outros], dtype=object)
+        self._lock = threading.Lock()
+        self._limpar_memo()
+
+    def _limpar_memo(self):
+        self._nomes = pa.array([], pa.string())
+        self._regra_dos_nomes = np.array([], dtype=np.int16)
+        self._regra_por_nome = {}
+
+    @classmethod
+    def do_arquivo(cls, caminho):
+        """Carrega as regras de um JSON {categoria: [termos]} (a ordem do arquivo é a ordem das regras)."""
+        with open(caminho, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def _regras(self, condicoes):
+        """Índice da primeira regra verdadeira em cada linha (len(categorias) = outros)."""
+        return np.select(condicoes, np.arange(len(condicoes)), len(condicoes)).astype(np.int16) if condicoes else None
+
+    def _regra_do_nome(self, nome):
+        regra = self._regra_por_nome.get(nome)
+        if regra is None:
+            texto = '' if pd.isna(nome) else normalizar_texto(str(nome))
+            regra = next((i for i, termos in enumerate(self.termos) for termo in termos if termo in texto), len(self.termos))
+            if len(self._regra_por_nome) >= MAX_NOMES_MEMORIZADOS:
+                self._regra_por_nome.clear()
+            self._regra_por_nome[nome] = regra
+        return regra
+
+    def classificar_varios(self, nomes):
+        """Classifica uma Series de nomes: só os nomes distintos ainda não vistos passam pelas regras."""
+        nomes = pd.Series(nomes, copy=False)
+        if not self.padroes:
+            return pd.Series(self.outros, index=nomes.index, name=nomes.name, dtype=object)
+        if len(nomes) < MIN_NOMES_ARROW:
+            regra = [self._regra_do_nome(nome) for nome in nomes.tolist()]
+            return pd.Series(self._rotulos[regra], index=nomes.index, name=nomes.name, dtype=object)
+        codificado = pc.dictionary_encode(_para_arrow(nomes))
+        unicos, codigos = codificado.dictionary, codificado.indices.to_numpy(zero_copy_only=False)
+        with self._lock:
+            conhecidos, regra_conhecida = self._nomes, self._regra_dos_nomes
+        posicao = pc.fill_null(pc.index_in(unicos, value_set=conhecidos), -1).to_numpy(zero_copy_only=False)
+        novos = np.flatnonzero(posicao < 0)
+        regra = regra_conhecida[np.maximum(posicao, 0)] if len(regra_conhecida) else np.zeros(len(unicos), dtype=np.int16)
+        if len(novos):
+            nomes_novos = unicos.take(pa.array(novos))
+            textos = _normalizar_arrow(nomes_novos)
+            regra[novos] = self._regras([pc.match_substring_regex(textos, padrao).to_numpy(zero_copy_only=False) for padrao in self.padroes])
+            with self._lock:
+                if len(self._nomes) + len(novos) > MAX_NOMES_MEMORIZADOS:
+                    self._limpar_memo()
+                self._nomes = pa.concat_arrays([self._nomes, nomes_novos])
+                self._regra_dos_nomes = np.concatenate([self._regra_dos_nomes, regra[novos]])
+        return pd.Series(self._rotulos[regra[codigos]], index=nomes.index, name=nomes.name, dtype=object)
+
+
+@lru_cache(maxsize=1)
+def classificador_padrao():
+    """Classificador do processo: regras do SUS_REGRAS_CATEGORIA, se houver, senão as padrão."""
+    return ClassificadorUnidades.do_arquivo(ARQUIVO_REGRAS) if ARQUIVO_REGRAS else ClassificadorUnidades()
+
+
+def classificar_unidades(nomes):
+    """Classifica uma Series de nomes, aplicando as regras uma vez por nome distinto."""
+    return classificador_padrao().classificar_varios(nomes)
+
+
+def calcular_execucao(produzido, teto):
+    """% de execução (produzido / teto * 100), com 0 quando o teto não é positivo."""
+    produzido = np.asarray(produzido, dtype=float)
+    teto = np.asarray(teto, dtype=float)
+    return np.divide(produzido * 100, teto, out=np.zeros_like(produzido), where=teto > 0)
+
+
+def processar_consolidado(df_papa_filtrado, df_teto):
+    if df_papa_filtrado.empty:
+        final = df_teto.copy(); final['Valor_Produzido'] = 0.0
+    else:
+        col_val = next((c for c in df_papa_filtrado.columns if 'VALAPR' in c), 'PA_VALAPR')
+        prod = df_papa_filtrado.groupby('CNES_KEY', sort=False, observed=True)[col_val].sum().rename('Valor_Produzido').reset_index()
+        final = pd.merge(df_teto, prod, on='CNES_KEY', how='outer')
+        final[['Valor_Teto', 'Valor_Produzido']] = final[['Valor_Teto', 'Valor_Produzido']].fillna(0)
+
+    unidade = final['Unidade'].astype(object)
+    desconhecida = unidade.isna() | unidade.isin([0, '0'])
+    final['Unidade'] = unidade.where(~desconhecida, 'Unidade Desconhecida').astype(str)
+    final['Saldo'] = final['Valor_Teto'].to_numpy(dtype=float) - final['Valor_Produzido'].to_numpy(dtype=float)
+    final['% Execucao'] = calcular_execucao(final['Valor_Produzido'], final['Valor_Teto'])
+    final['Categoria'] = classificar_unidades(final['Unidade'])
+    return final
@@ -0,0 +1,86 @@
+"""Cubo pré-agregado da produção (CNES x competência x procedimento x categoria).
+
+O cubo é montado uma vez no carregamento. As dimensões ficam como
+`category` e as medidas (valor, quantidade, registros) já somadas, de modo que
+os filtros da tela fatiam algumas milhares de linhas em vez de varrer o PAPA
+bruto a cada interação.
+
+As funções de consulta (fatiar, somar_por, competencias_disponiveis,
+cnes_disponiveis) aceitam também um cubo fora da memória (fontes_cubo), e aí
+delegam para ele.
+"""
+import numpy as np
+import pandas as pd
+
+from consolidacao import classificar_unidades
+from periodos import SEM_COMPETENCIA, unidades_vigentes
+
+DIMENSOES = ['CNES_KEY', 'COMPETENCIA', 'PA_PROC_ID', 'Categoria']
+MEDIDAS = ['PA_VALAPR', 'PA_QTDAPR', 'N_REGISTROS']
+
+
+def cubo_vazio():
+    cubo = pd.DataFrame({d: pd.Categorical([]) for d in DIMENSOES})
+    for m in MEDIDAS:
+        cubo[m] = pd.Series([], dtype=float)
+    return cubo
+
+
+def construir_cubo(df_papa, df_teto):
+    """Agrega o PAPA (bruto ou parciais do modo em blocos) nas dimensões do cubo."""
+    if df_papa.empty or 'CNES_KEY' not in df_papa.columns:
+        return cubo_vazio()
+
+    col_val = next((c for c in df_papa.columns if 'VALAPR' in c), 'PA_VALAPR')
+    col_qtd = next((c for c in df_papa.columns if 'QTDAPR' in c), None)
+    col_proc = next((c for c in df_papa.columns if 'PROC_ID' in c and 'ULTIMO_DIGITO' not in c), None)
+
+    base = pd.DataFrame({
+        'CNES_KEY': df_papa['CNES_KEY'],
+        'COMPETENCIA': df_papa['COMPETENCIA'].astype(str) if 'COMPETENCIA' in df_papa.columns else SEM_COMPETENCIA,
+        'PA_PROC_ID': df_papa[col_proc].astype(str).str.strip() if col_proc else '',
+        'PA_VALAPR': df_papa[col_val].astype(float),
+        'PA_QTDAPR': pd.to_numeric(df_papa[col_qtd], errors='coerce').fillna(0) if col_qtd else 0.0,
+        'N_REGISTROS': df_papa['N_REGISTROS'] if 'N_REGISTROS' in df_papa.columns else 1,
+    })
+    cubo = base.groupby(['CNES_KEY', 'COMPETENCIA', 'PA_PROC_ID'], sort=False).sum().reset_index()
+
+    # Categoria vem do nome da unidade no Espelho (mesma regra do processar_consolidado).
+    nome_por_cnes = cubo['CNES_KEY'].map(unidades_vigentes(df_teto)).fillna('Unidade Desconhecida').astype(str)
+    cubo['Categoria'] = classificar_unidades(nome_por_cnes)
+
+    for d in DIMENSOES:
+        cubo[d] = cubo[d].astype('category')
+    for m in MEDIDAS:
+        cubo[m] = cubo[m].astype(float)
+    return cubo[DIMENSOES + MEDIDAS]
+
+
+def fatiar(cubo, competencias=None, cnes=None, categorias=None):
+    """Seleciona o subcubo pelas dimensões informadas (None = sem filtro)."""
+    if not isinstance(cubo, pd.DataFrame):
+        return cubo.fatiar(competencias, cnes, categorias)
+    mascara = np.ones(len(cubo), dtype=bool)
+    for dim, valores in (('COMPETENCIA', competencias), ('CNES_KEY', cnes), ('Categoria', categorias)):
+        if valores is not None:
+            mascara &= cubo[dim].isin(valores).to_numpy()
+    return cubo[mascara]
+
+
+def somar_por(cubo, dimensao, medidas=('PA_VALAPR',)):
+    """Soma as medidas do (sub)cubo por uma dimensão, só com os valores presentes."""
+    if not isinstance(cubo, pd.DataFrame):
+        return cubo.somar(dimensao, medidas)
+    return cubo.groupby(dimensao, observed=True)[list(medidas)].sum().reset_index()
+
+
+def competencias_disponiveis(cubo):
+    if not isinstance(cubo, pd.DataFrame):
+        return cubo.competencias()
+    return sorted(map(str, cubo['COMPETENCIA'].unique())) if not cubo.empty else []
+
+
+def cnes_disponiveis(cubo):
+    if not isinstance(cubo, pd.DataFrame):
+        return cubo.cnes()
+    return cubo['CNES_KEY'].unique()
@@ -0,0 +1,184 @@
+"""Exportação da seleção atual (Excel, Parquet, CSV) a partir das visões já agregadas.
+
+O pacote tem sempre as mesmas tabelas: execução por unidade, evolução por
+competência, top procedimentos e mapeamento CNES. Elas saem do consolidado e
+do cubo do período (nunca do PAPA linha a linha), então o tamanho do arquivo
+depende do número de unidades e procedimentos, não do volume de produção.
+
+A geração roda numa thread do `Exportador`, fora do rerun: a sessão pede o
+arquivo, continua respondendo e baixa quando ficar pronto. Os arquivos são
+escritos em fluxo (Excel em modo write-only, Parquet e CSV direto dentro do
+zip) e identificados pela chave (conjunto, filtros, formato): o mesmo pedido,
+de qualquer sessão, reaproveita o arquivo já gerado.
+
+Configuração:
+    SUS_EXPORTACAO_DIR      pasta dos arquivos gerados (padrão: temporária do sistema)
+    SUS_EXPORTACAO_WORKERS  exportações simultâneas (padrão 2)
+    SUS_EXPORTACAO_MAX      arquivos mantidos; os mais antigos são apagados (padrão 32)
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from consolidacao import normalizar_texto
+from motor import calcular_timeline, calcular_top_procedimentos
+
+DIR_EXPORTACAO = os.environ.get("SUS_EXPORTACAO_DIR", os.path.join(tempfile.gettempdir(), "sus_exportacoes"))
+WORKERS_PADRAO = max(1, int(os.environ.get("SUS_EXPORTACAO_WORKERS", "2") or 2))
+MAX_ARQUIVOS_PADRAO = max(1, int(os.environ.get("SUS_EXPORTACAO_MAX", "32") or 32))
+TOP_PROCEDIMENTOS = 50
+
+# Formato -> (extensão, MIME)
+FORMATOS = {
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'Parquet': ('parquet.zip', 'application/zip'),
+    'CSV': ('csv.zip', 'application/zip'),
+}
+COLUNAS_MOEDA = ['Teto Acumulado', 'Teto Mensal', 'Produção Total', 'Saldo', 'Valor Total']
+LINHAS_POR_BLOCO_CSV = 50000
+
+
+def tabelas_exportacao(df_view, cubo_periodo, catalogo, top_n=TOP_PROCEDIMENTOS):
+    """As tabelas do pacote (nome da aba -> DataFrame), com colunas prontas para leitura."""
+    cnes = df_view['CNES_KEY'].unique()
+    execucao = df_view[['CNES_KEY', 'Unidade', 'Categoria', 'Valor_Teto', 'Teto_Mensal', 'Valor_Produzido', 'Saldo', '% Execucao']].rename(columns={
+        'CNES_KEY': 'CNES', 'Valor_Teto': 'Teto Acumulado', 'Teto_Mensal': 'Teto Mensal',
+        'Valor_Produzido': 'Produção Total', '% Execucao': 'Execução (%)'})
+    execucao = execucao.sort_values('Teto Acumulado', ascending=False, kind='stable')
+    timeline = calcular_timeline(cubo_periodo, cnes=cnes)
+    evolucao = timeline[['COMPETENCIA', 'Periodo', 'PA_VALAPR']].rename(columns={'COMPETENCIA': 'Competência', 'Periodo': 'Período', 'PA_VALAPR': 'Produção Total'})
+    top = calcular_top_procedimentos(cubo_periodo, catalogo, cnes=cnes, n=top_n)
+    top = top[['PA_PROC_ID', 'Procedimento', 'PA_QTDAPR', 'PA_VALAPR']].rename(columns={'PA_PROC_ID': 'Código', 'PA_QTDAPR': 'Quantidade', 'PA_VALAPR': 'Valor Total'})
+    mapeamento = df_view[['CNES_KEY', 'Unidade', 'Categoria']].drop_duplicates().rename(columns={'CNES_KEY': 'CNES'})
+    tabelas = {
+        'Execução por Unidade': execucao.reset_index(drop=True),
+        'Evolução Mensal': evolucao.reset_index(drop=True),
+        'Top Procedimentos': top.reset_index(drop=True),
+        'Mapeamento CNES': mapeamento.reset_index(drop=True),
+    }
+    # Centavos (e % com 2 casas): sem o ruído de ponto flutuante nos arquivos texto
+    for df in tabelas.values():
+        for coluna in df.columns.intersection(COLUNAS_MOEDA + ['Execução (%)']):
+            df[coluna] = df[coluna].round(2)
+    return tabelas
+
+
+def _nome_arquivo(aba):
+    return normalizar_texto(aba).replace(' ', '_').lower()
+
+
+# --- ESCRITA EM FLUXO ---
+def escrever_excel(tabelas, destino):
+    """Uma aba por tabela, linha a linha (write-only: não guarda a planilha inteira na memória)."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    for aba, df in tabelas.items():
+        ws = wb.create_sheet(title=aba[:31])
+        ws.freeze_panes = 'A2'
+        for i, coluna in enumerate(df.columns):
+            ws.column_dimensions[get_column_letter(i + 1)].width = 45 if coluna in ('Unidade', 'Procedimento') else 18
+        ws.append(list(df.columns))
+        moeda = [i for i, c in enumerate(df.columns) if c in COLUNAS_MOEDA]
+        # Valores Python (NaN -> célula vazia) de uma vez por tabela, não célula a célula
+        valores = df.astype(object).where(df.notna(), None)
+        for linha in valores.itertuples(index=False, name=None):
+            linha = list(linha)
+            for i in moeda:
+                linha[i] = WriteOnlyCell(ws, value=linha[i])
+                linha[i].number_format = '#,##0.00'
+            ws.append(linha)
+    wb.save(destino)
+
+
+def escrever_parquet(tabelas, destino):
+    """Um Parquet por tabela, gravado direto dentro do zip."""
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_STORED) as zf:
+        for aba, df in tabelas.items():
+            with zf.open(f"{_nome_arquivo(aba)}.parquet", 'w') as saida:
+                pq.write_table(pa.Table.from_pandas(df, preserve_index=False), saida, compression='zstd')
+
+
+def escrever_csv(tabelas, destino):
+    """Um CSV por tabela (separador ";" e vírgula decimal, como o Excel em português abre), em blocos dentro do zip."""
+    with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for aba, df in tabelas.items():
+            with zf.open(f"{_nome_arquivo(aba)}.csv", 'w') as saida, io.TextIOWrapper(saida, encoding='utf-8-sig', newline='') as texto:
+                df.to_csv(texto, sep=';', decimal=',', index=False, chunksize=LINHAS_POR_BLOCO_CSV)
+
+
+ESCRITORES = {'Excel': escrever_excel, 'Parquet': escrever_parquet, 'CSV': escrever_csv}
+
+
+def exportar(tabelas, formato, destino):
+    """Grava o pacote em `destino` (primeiro num temporário, para nunca expor arquivo pela metade)."""
+    os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+    temporario = f"{destino}.{threading.get_ident()}.tmp"
+    try:
+        ESCRITORES[formato](tabelas, temporario)
+        os.replace(temporario, destino)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    return destino
+
+
+# --- GERAÇÃO EM SEGUNDO PLANO ---
+def chave_exportacao(versao, estado, formato):
+    return hashlib.sha256(repr((versao, estado, formato)).encode()).hexdigest()[:24]
+
+
+class Exportador:
+    """Fila de exportações compartilhada entre as sessões (uma tarefa por chave)."""
+
+    def __init__(self, pasta=DIR_EXPORTACAO, workers=WORKERS_PADRAO, max_arquivos=MAX_ARQUIVOS_PADRAO):
+        self.pasta = pasta
+        self.max_arquivos = max_arquivos
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="exportacao")
+        self._tarefas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def caminho(self, chave, formato):
+        return os.path.join(self.pasta, f"{chave}.{FORMATOS[formato][0]}")
+
+    def tarefa(self, chave):
+        """Tarefa da chave, ou None se nunca foi pedida (ou se o arquivo já foi apagado)."""
+        with self._lock:
+            tarefa = self._tarefas.get(chave)
+            if tarefa is not None and tarefa.done() and tarefa.exception() is None and not os.path.exists(tarefa.result()):
+                del self._tarefas[chave]
+                return None
+            return tarefa
+
+    def solicitar(self, chave, formato, montar_tabelas):
+        """Enfileira a exportação (se ainda não existir) e devolve o Future com o caminho do arquivo.
+
+        `montar_tabelas()` roda na thread de exportação e não pode usar o Streamlit.
+        """
+        with self._lock:
+            tarefa = self._tarefas.get(chave)
+            if tarefa is not None and not (tarefa.done() and tarefa.exception() is not None):
+                self._tarefas.move_to_end(chave)
+                return tarefa
+            tarefa = self._executor.submit(lambda: exportar(montar_tabelas(), formato, self.caminho(chave, formato)))
+            self._tarefas[chave] = tarefa
+            self._descartar_antigas()
+            return tarefa
+
+    def _descartar_antigas(self):
+        # Só sai tarefa já concluída; o arquivo dela vai junto
+        concluidas = [c for c, t in self._tarefas.items() if t.done()]
+        while len(self._tarefas) > self.max_arquivos and concluidas:
+            tarefa = self._tarefas.pop(concluidas.pop(0))
+            if tarefa.exception() is None and os.path.exists(tarefa.result()):
+                os.remove(tarefa.result())
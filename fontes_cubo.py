@@ -0,0 +1,194 @@
+"""Motores de consulta do cubo: pandas (em memória), Arrow ou DuckDB (fora da memória).
+
+Todas as consultas do dashboard (execução por unidade, evolução, top
+procedimentos) se reduzem a "fatiar o cubo e somar por algumas dimensões".
+Com o motor pandas o cubo é um DataFrame em memória, o padrão para uploads e
+municípios. Com os motores fora da memória o cubo fica no Parquet em disco
+(resultados do processar_lote.py ou conjuntos do registro) e cada consulta é
+uma varredura colunar, em várias threads, com filtro e agregação em fluxo: só
+as colunas usadas são lidas e só o resultado agregado vai para a memória.
+
+As fontes têm a mesma interface (fatiar, somar, competencias, cnes, columns,
+empty, len) e as funções de cubo.py aceitam tanto o DataFrame quanto uma
+fonte, então motor.py, o app e a exportação não mudam. O DuckDB é opcional;
+sem ele, o modo fora da memória usa o Arrow (acero).
+
+Configuração:
+    SUS_MOTOR_CONSULTA   pandas | arrow | duckdb | auto (padrão auto)
+    SUS_MOTOR_LIMITE_MB  no modo auto, cubos em disco maiores que isso são
+                         consultados fora da memória (padrão 256)
+"""
+import os
+from functools import reduce
+
+import pandas as pd
+
+import pyarrow as pa
+import pyarrow.acero as acero
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+try:
+    import duckdb
+except ImportError:  # DuckDB é opcional.
+    duckdb = None
+
+MOTOR_PADRAO = os.environ.get("SUS_MOTOR_CONSULTA", "auto").lower()
+LIMITE_MB_PADRAO = float(os.environ.get("SUS_MOTOR_LIMITE_MB", "256") or 256)
+FILTRAVEIS = ('COMPETENCIA', 'CNES_KEY', 'Categoria')
+
+
+def motores_disponiveis():
+    return ['pandas', 'arrow'] + (['duckdb'] if duckdb is not None else [])
+
+
+def escolher_motor(tamanho_bytes, motor=None):
+    """Motor para um cubo em disco deste tamanho. Motor pedido e não instalado cai no mais próximo."""
+    motor = (motor or MOTOR_PADRAO).lower()
+    disponiveis = motores_disponiveis()
+    fora_da_memoria = 'duckdb' if 'duckdb' in disponiveis else 'arrow' if 'arrow' in disponiveis else 'pandas'
+    if motor == 'auto':
+        return fora_da_memoria if tamanho_bytes > LIMITE_MB_PADRAO * 1e6 else 'pandas'
+    if motor not in disponiveis:
+        return fora_da_memoria if motor in ('arrow', 'duckdb') else 'pandas'
+    return motor
+
+
+def abrir_cubo(caminho, motor=None):
+    """DataFrame (motor pandas, memory-map) ou fonte fora da memória sobre o Parquet do cubo."""
+    motor = escolher_motor(os.path.getsize(caminho), motor)
+    if motor == 'pandas':
+        return pd.read_parquet(caminho, memory_map=True)
+    return FONTES[motor]([caminho])
+
+
+def nome_motor(cubo):
+    return 'pandas' if isinstance(cubo, pd.DataFrame) else cubo.motor
+
+
+def _como_lista(dimensoes):
+    return [dimensoes] if isinstance(dimensoes, str) else list(dimensoes)
+
+
+class FonteArrow:
+    """Cubo em Parquet consultado com o acero do Arrow (varredura + agregação em hash, multi-thread).
+
+    `fatiar` só acumula filtros (nada é lido); `somar` faz uma varredura com
+    projeção das colunas usadas e filtro empurrado para a leitura. Cada fonte
+    tem filtros fixos, então contagem (len, empty) e listas de competências e
+    CNES são consultadas uma vez e guardadas.
+    """
+    motor = 'arrow'
+
+    def __init__(self, arquivos, filtros=None, dataset=None):
+        self.arquivos = list(arquivos)
+        self.filtros = dict(filtros or {})
+        self._dataset = dataset if dataset is not None else self._abrir()
+        self._linhas = self._competencias = self._cnes = None
+
+    def _abrir(self):
+        # Dimensões gravadas como dicionário (category) são lidas como texto: cada arquivo
+        # tem o seu dicionário, e texto simples dá as mesmas chaves em todos
+        esquema = ds.dataset(self.arquivos, format='parquet').schema
+        esquema = pa.schema([pa.field(c.name, pa.string() if pa.types.is_dictionary(c.type) else c.type) for c in esquema])
+        return ds.dataset(self.arquivos, format='parquet', schema=esquema)
+
+    def __reduce__(self):
+        return (type(self), (self.arquivos, self.filtros))
+
+    @property
+    def columns(self):
+        return pd.Index(self._dataset.schema.names)
+
+    def fatiar(self, competencias=None, cnes=None, categorias=None):
+        """Nova fonte com os filtros somados aos atuais (mesma semântica do cubo.fatiar)."""
+        filtros = dict(self.filtros)
+        for dim, valores in zip(FILTRAVEIS, (competencias, cnes, categorias)):
+            if valores is None:
+                continue
+            valores = tuple(dict.fromkeys(map(str, valores)))
+            if dim in filtros:
+                atuais = set(filtros[dim])
+                valores = tuple(v for v in valores if v in atuais)
+            filtros[dim] = valores
+        return type(self)(self.arquivos, filtros, self._dataset)
+
+    def _expressao(self):
+        # Conjunto de valores tipado: lista vazia viraria array nulo e o isin recusa o tipo
+        condicoes = [pc.field(dim).isin(pa.array(list(valores), pa.string())) for dim, valores in self.filtros.items()]
+        return reduce(lambda a, b: a & b, condicoes) if condicoes else None
+
+    def _vazio(self, dimensoes, medidas):
+        return pd.DataFrame({**{d: pd.Series(dtype='str') for d in dimensoes}, **{m: pd.Series(dtype=float) for m in medidas}})
+
+    def somar(self, dimensoes, medidas=('PA_VALAPR',)):
+        """Soma das medidas por dimensão, ordenada pelas dimensões (como o groupby do pandas)."""
+        dimensoes, medidas = _como_lista(dimensoes), list(medidas)
+        filtro = self._expressao()
+        etapas = [acero.Declaration('scan', acero.ScanNodeOptions(self._dataset, columns=list(dict.fromkeys(dimensoes + medidas + list(self.filtros))), filter=filtro))]
+        if filtro is not None:
+            # O filtro do scan só poda arquivos e grupos de linhas; o nó de filtro é quem descarta as linhas
+            etapas.append(acero.Declaration('filter', acero.FilterNodeOptions(filtro)))
+        etapas.append(acero.Declaration('aggregate', acero.AggregateNodeOptions([(m, 'hash_sum', None, m) for m in medidas], keys=dimensoes)))
+        tabela = acero.Declaration.from_sequence(etapas).to_table(use_threads=True)
+        if tabela.num_rows == 0:
+            return self._vazio(dimensoes, medidas)
+        resultado = tabela.to_pandas()
+        resultado[medidas] = resultado[medidas].astype(float)
+        return resultado[dimensoes + medidas].sort_values(dimensoes, kind='stable').reset_index(drop=True)
+
+    def competencias(self):
+        if self._competencias is None:
+            self._competencias = sorted(self.somar('COMPETENCIA', ('N_REGISTROS',))['COMPETENCIA'].astype(str))
+        return list(self._competencias)
+
+    def cnes(self):
+        if self._cnes is None:
+            self._cnes = self.somar('CNES_KEY', ('N_REGISTROS',))['CNES_KEY'].to_numpy(dtype=object)
+        return self._cnes
+
+    def _contar(self):
+        return self._dataset.count_rows(filter=self._expressao())
+
+    def __len__(self):
+        if self._linhas is None:
+            self._linhas = self._contar()
+        return self._linhas
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+
+class FonteDuckDB(FonteArrow):
+    """Mesma fonte, com as consultas em SQL no DuckDB (read_parquet, paralelo e fora da memória)."""
+    motor = 'duckdb'
+
+    def _consultar(self, selecao, agrupar=None):
+        condicoes, parametros = [], [self.arquivos]
+        for dim, valores in self.filtros.items():
+            condicoes.append(f'list_contains(?, CAST("{dim}" AS VARCHAR))')
+            parametros.append(list(valores))
+        sql = f"SELECT {selecao} FROM read_parquet(?)"
+        if condicoes: sql += " WHERE " + " AND ".join(condicoes)
+        if agrupar: sql += f" GROUP BY {agrupar} ORDER BY {agrupar}"
+        # Uma conexão por consulta: várias sessões podem consultar ao mesmo tempo
+        with duckdb.connect() as con:
+            return con.execute(sql, parametros).df()
+
+    def somar(self, dimensoes, medidas=('PA_VALAPR',)):
+        dimensoes, medidas = _como_lista(dimensoes), list(medidas)
+        chaves = ", ".join(f'CAST("{d}" AS VARCHAR) AS "{d}"' for d in dimensoes)
+        somas = ", ".join(f'SUM("{m}")::DOUBLE AS "{m}"' for m in medidas)
+        resultado = self._consultar(f"{chaves}, {somas}", ", ".join(f'"{d}"' for d in dimensoes))
+        if resultado.empty:
+            return self._vazio(dimensoes, medidas)
+        for d in dimensoes:
+            resultado[d] = resultado[d].astype('str')
+        return resultado
+
+    def _contar(self):
+        return int(self._consultar("COUNT(*) AS n")['n'].iloc[0])
+
+
+FONTES = {'arrow': FonteArrow, 'duckdb': FonteDuckDB}
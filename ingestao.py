@@ -0,0 +1,181 @@
+"""Leitura dos arquivos PAPA/Espelho, com execução paralela opcional.
+
+Os parsers ficam num módulo importável para que possam rodar em processos
+separados (o script do Streamlit não é importável pelos workers).
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+import pandas as pd
+
+from cache_colunar import TAMANHO_BLOCO, em_cache, hash_conteudo, ler_com_cache
+from compactados import abrir_membro, listar_membros, nome_origem
+from consolidacao import normalizar_texto
+from leitura_papa import agregar_parcial, competencia_dos_registros, detectar_separador
+from numeros_br import ler_numeros_br
+from periodos import SEM_COMPETENCIA, normalizar_competencias
+
+WORKERS_PADRAO = max(1, int(os.environ.get("SUS_WORKERS", "1") or 1))
+USAR_PROCESSOS_PADRAO = os.environ.get("SUS_MODO_PARALELO", "threads").lower() == "processos"
+
+
+def encontrar_coluna_valor(df_columns):
+    cols_norm = [normalizar_texto(c) for c in df_columns]
+    for i, col_norm in enumerate(cols_norm):
+        # Procura genérica por coluna de orçamento/valor total
+        if 'TOTAL' in col_norm and 'ORC' in col_norm: return df_columns[i]
+        if 'ORCAMENT' in col_norm: return df_columns[i]
+        if 'VLR TOTAL' in col_norm: return df_columns[i]
+    # Fallback pela posição (colunas 8 ou 9 costumam ser valores no espelho padrão)
+    if len(df_columns) > 8: return df_columns[8]
+    return None
+
+
+def ler_csv_sus(file):
+    """Lê o CSV em latin1, com o separador (vírgula ou ponto e vírgula) detectado pelo cabeçalho."""
+    return pd.read_csv(file, sep=detectar_separador(file), encoding='latin1', dtype=str)
+
+
+def parse_arquivo_papa(file):
+    """Leitura tipada de um PAPA (é o que fica salvo no cache colunar)."""
+    df_temp = ler_csv_sus(file)
+    if 'PA_NAT_JUR' in df_temp.columns:
+        df_temp['PA_NAT_JUR'] = df_temp['PA_NAT_JUR'].astype(str).str.strip()
+    col_val = next((c for c in df_temp.columns if 'VALAPR' in c), None)
+    if col_val: df_temp[col_val] = ler_numeros_br(df_temp[col_val])
+    col_cnes = next((c for c in df_temp.columns if 'CODUNI' in c), None)
+    if col_cnes: df_temp['CNES_KEY'] = df_temp[col_cnes].astype(str).str.strip().str.replace('"', '').str.zfill(7)
+    df_temp['COMPETENCIA'] = competencia_dos_registros(df_temp)
+    return df_temp
+
+
+def parcial_papa(file):
+    """Parcial mensal de um PAPA: leitura completa, filtro 1031 e agregação por (CNES, procedimento)."""
+    return agregar_parcial(parse_arquivo_papa(file))
+
+
+def parse_arquivo_espelho(file):
+    """Leitura tipada de um Espelho (é o que fica salvo no cache colunar)."""
+    df_temp = ler_csv_sus(file)
+    col_teto = encontrar_coluna_valor(df_temp.columns)
+    if col_teto: df_temp['Valor_Teto'] = ler_numeros_br(df_temp[col_teto])
+    return df_temp
+
+
+def agregar_teto(df_espelho):
+    """Teto de um Espelho por (CNES_KEY, Unidade, COMPETENCIA), com a competência da coluna Competência."""
+    if 'Valor_Teto' not in df_espelho.columns:
+        return pd.DataFrame()
+    headers_esp = [normalizar_texto(c) for c in df_espelho.columns]
+    idx_cnes = next((i for i, h in enumerate(headers_esp) if 'CNES' in h), 11)
+    col_cnes = df_espelho.columns[idx_cnes]
+
+    idx_nome = next((i for i, h in enumerate(headers_esp) if ('NOME' in h and 'ESTAB' in h) or 'UNIDADE' in h), 12)
+    col_nome = df_espelho.columns[idx_nome]
+
+    idx_comp = next((i for i, h in enumerate(headers_esp) if 'COMPET' in h), None)
+    if idx_comp is not None:
+        competencia = normalizar_competencias(df_espelho[df_espelho.columns[idx_comp]])
+    else:
+        competencia = pd.Series(SEM_COMPETENCIA, index=df_espelho.index, dtype='str')
+
+    chave = df_espelho[col_cnes].astype(str).str.strip().str.replace('"', '').str.zfill(7)
+    teto = df_espelho['Valor_Teto'].groupby([chave.rename('CNES_KEY'), df_espelho[col_nome].rename('Unidade'), competencia.rename('COMPETENCIA')]).sum()
+    return teto.reset_index()
+
+
+def consolidar_teto(parciais):
+    """Soma as parciais de teto de vários Espelhos (cada competência continua separada)."""
+    parciais = [p for p in parciais if not p.empty]
+    if not parciais:
+        return pd.DataFrame()
+    return pd.concat(parciais, ignore_index=True).groupby(['CNES_KEY', 'Unidade', 'COMPETENCIA'])['Valor_Teto'].sum().reset_index()
+
+
+# --- LEITURA PARALELA ---
+def _chave_membro(chave_origem, membro):
+    """Chave de cache do membro: hash do arquivo enviado + nome interno (sem descompactar)."""
+    if membro.interno is None and membro.formato == 'csv':
+        return chave_origem
+    sufixo = hashlib.sha1(f"{membro.formato}:{membro.interno}".encode('utf-8')).hexdigest()[:12]
+    return f"{chave_origem}-{sufixo}"
+
+
+def _ler_membro(membro, chave, tipo, parser):
+    inicio = time.perf_counter()
+    with abrir_membro(membro) as stream:
+        df = ler_com_cache(stream, tipo, parser, chave=chave)
+    return df, time.perf_counter() - inicio
+
+
+def _em_disco(membros, pasta):
+    """Para os workers: uploads em memória são gravados em `pasta`, uma vez por arquivo (não por membro)."""
+    caminhos, convertidos = {}, []
+    for m in membros:
+        if not isinstance(m.origem, (str, os.PathLike)):
+            if id(m.origem) not in caminhos:
+                destino = os.path.join(pasta, str(len(caminhos)), os.path.basename(nome_origem(m.origem)) or 'arquivo')
+                os.makedirs(os.path.dirname(destino))
+                m.origem.seek(0)
+                with open(destino, 'wb') as f:
+                    shutil.copyfileobj(m.origem, f, TAMANHO_BLOCO)
+                m.origem.seek(0)
+                caminhos[id(m.origem)] = destino
+            m = m._replace(origem=caminhos[id(m.origem)])
+        convertidos.append(m)
+    return convertidos
+
+
+def ler_arquivos(files, tipo, parser, workers=1, usar_processos=False):
+    """Lê vários arquivos com `parser` (passando pelo cache colunar).
+
+    Arquivos compactados (zip, gzip, zstd) são expandidos em seus membros, e
+    cada membro é lido como stream. Com `workers` > 1 os membros são lidos em
+    paralelo, por threads ou, com `usar_processos`, por um pool de processos.
+    Retorna a lista de (nome do membro, DataFrame) e um DataFrame com o tempo
+    de leitura de cada membro.
+    """
+    membros, chaves = [], []
+    for f in files:
+        chave_origem = hash_conteudo(f)
+        for m in listar_membros(f):
+            membros.append(m)
+            chaves.append(_chave_membro(chave_origem, m))
+    workers = max(1, min(int(workers), len(membros))) if membros else 1
+
+    if workers == 1:
+        resultados = [_ler_membro(m, c, tipo, parser) for m, c in zip(membros, chaves)]
+    elif usar_processos:
+        # Membros já em cache são abertos aqui mesmo (memory-map); só os demais vão aos workers,
+        # que recebem caminhos de arquivo em vez dos bytes do upload
+        resultados = [None] * len(membros)
+        pendentes = []
+        for i, (m, c) in enumerate(zip(membros, chaves)):
+            if em_cache(tipo, c):
+                resultados[i] = _ler_membro(m, c, tipo, parser)
+            else:
+                pendentes.append(i)
+        if pendentes:
+            # 'spawn' evita herdar as threads do servidor do Streamlit via fork
+            with tempfile.TemporaryDirectory(prefix="sus_leitura_") as pasta:
+                enviados = _em_disco([membros[i] for i in pendentes], pasta)
+                with ProcessPoolExecutor(max_workers=min(workers, len(pendentes)), mp_context=get_context('spawn')) as pool:
+                    futuros = [pool.submit(_ler_membro, m, chaves[i], tipo, parser) for i, m in zip(pendentes, enviados)]
+                    for i, fut in zip(pendentes, futuros):
+                        resultados[i] = fut.result()
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            resultados = list(pool.map(lambda mc: _ler_membro(mc[0], mc[1], tipo, parser), zip(membros, chaves)))
+
+    tempos = pd.DataFrame({
+        'Arquivo': [m.nome if m.interno is None else f"{os.path.basename(nome_origem(m.origem))} › {m.nome}" for m in membros],
+        'Tipo': tipo,
+        'Linhas': [len(df) for df, _ in resultados],
+        'Segundos': [seg for _, seg in resultados],
+    })
+    return [(m.nome, df) for m, (df, _) in zip(membros, resultados)], tempos
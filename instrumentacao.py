@@ -0,0 +1,110 @@
+"""Instrumentação das etapas de cada execução (rerun) do dashboard.
+
+Cada etapa é medida com `etapa(nome)`: tempo de parede, linhas processadas
+(informadas pela própria etapa) e variação de memória do processo. As medições
+de um rerun ficam num `Rastreador`, que o app mostra no painel de administração
+e grava como log estruturado (uma linha JSON por etapa) para o monitoramento.
+O app exporta as etapas no fim do rerun; se uma etapa falhar, as etapas do
+rerun até ali (com o campo `erro`) saem na hora, antes da exceção chegar ao
+Streamlit.
+
+Configuração:
+    SUS_LOG_INSTRUMENTACAO  arquivo JSONL onde as etapas são acrescentadas
+    SUS_ADMIN               "1" mostra o painel de instrumentação na sidebar
+
+Sem arquivo, as etapas saem no stderr pelo logger `sus.instrumentacao` (nível
+INFO). Quem já configurou um handler para esse logger fica com o dele.
+"""
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows: sem getrusage.
+    resource = None
+
+ARQUIVO_LOG = os.environ.get("SUS_LOG_INSTRUMENTACAO", "")
+COLUNAS = ['rerun', 'inicio', 'etapa', 'segundos', 'linhas', 'memoria_delta_mb', 'rss_mb', 'erro']
+
+logger = logging.getLogger("sus.instrumentacao")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    # O root do Streamlit tem formato próprio: sem propagar, cada etapa sai uma vez, em JSON puro
+    logger.propagate = False
+
+
+def admin_ativo():
+    return os.environ.get("SUS_ADMIN", "") in ("1", "true", "TRUE")
+
+
+def memoria_rss_mb():
+    """RSS atual do processo. Fora do Linux cai no pico (ru_maxrss), que só cresce; sem `resource`, None."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError, IndexError, AttributeError):
+        if resource is None:
+            return None
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Rastreador:
+    """Guarda as etapas medidas de um rerun."""
+
+    def __init__(self, rerun=None):
+        self.rerun = rerun or uuid.uuid4().hex[:12]
+        self.etapas = []
+        self._exportadas = 0
+        self._abertas = 0
+
+    @contextmanager
+    def etapa(self, nome, linhas=None):
+        """Mede o bloco. A etapa pode preencher `registro['linhas']` antes de sair."""
+        registro = {'rerun': self.rerun, 'inicio': datetime.now().isoformat(timespec='milliseconds'),
+                    'etapa': nome, 'linhas': linhas, 'erro': None}
+        rss_antes = memoria_rss_mb()
+        inicio = time.perf_counter()
+        self._abertas += 1
+        try:
+            yield registro
+        except Exception as e:
+            registro['erro'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            registro['segundos'] = round(time.perf_counter() - inicio, 4)
+            rss = memoria_rss_mb()
+            registro['rss_mb'] = None if rss is None else round(rss, 1)
+            registro['memoria_delta_mb'] = None if rss is None or rss_antes is None else round(rss - rss_antes, 1)
+            self.etapas.append(registro)
+            self._abertas -= 1
+            # Falha na etapa mais externa: o rerun não chega ao exportar() do fim
+            if registro['erro'] and not self._abertas:
+                self.exportar()
+
+    def tabela(self):
+        return pd.DataFrame(self.etapas, columns=COLUNAS)
+
+    def linhas_json(self, etapas=None):
+        return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in (self.etapas if etapas is None else etapas))
+
+    def exportar(self, arquivo=None):
+        """Envia ao arquivo JSONL, se configurado, ou ao logger as etapas ainda não exportadas."""
+        novas = self.etapas[self._exportadas:]
+        self._exportadas = len(self.etapas)
+        arquivo = arquivo or ARQUIVO_LOG
+        if arquivo and novas:
+            with open(arquivo, 'a', encoding='utf-8') as f:
+                f.write(self.linhas_json(novas))
+        elif novas:
+            for r in novas:
+                logger.info(json.dumps(r, ensure_ascii=False))
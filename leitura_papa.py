@@ -0,0 +1,131 @@
+"""Leitura em blocos (streaming) dos arquivos PAPA do SIA/SUS.
+
+Em vez de carregar o arquivo inteiro como texto e só depois filtrar, cada
+bloco é lido apenas com as colunas usadas pelo dashboard, filtrado pela
+natureza jurídica e já agregado por (CNES_KEY, COMPETENCIA, PA_PROC_ID). O pico de memória
+fica limitado ao tamanho do bloco, e não ao tamanho do arquivo.
+"""
+import os
+
+import pandas as pd
+
+from numeros_br import ler_numeros_br
+from periodos import SEM_COMPETENCIA, normalizar_competencias
+
+NAT_JUR_PADRAO = '1031'
+TAMANHO_BLOCO = int(os.environ.get("SUS_TAMANHO_BLOCO", "200000"))
+CHAVES_AGREGACAO = ['CNES_KEY', 'COMPETENCIA', 'PA_PROC_ID']
+MEDIDAS = ['PA_VALAPR', 'PA_QTDAPR', 'N_REGISTROS']
+# Coluna que dá o período de cada registro. PA_MVM (mês de processamento) bate com o
+# arquivo e com o teto do mês; PA_CMP (mês de realização) espalha a produção apresentada
+# com atraso pelos meses anteriores.
+COLUNA_COMPETENCIA = os.environ.get("SUS_COLUNA_COMPETENCIA", "PA_MVM")
+
+# Trechos de nome que identificam as colunas necessárias (mesma regra do load_data_raw).
+_COLUNAS_USADAS = {
+    'CODUNI': 'PA_CODUNI',
+    'PROC_ID': 'PA_PROC_ID',
+    'VALAPR': 'PA_VALAPR',
+    'QTDAPR': 'PA_QTDAPR',
+    'NAT_JUR': 'PA_NAT_JUR',
+    'MVM': 'PA_MVM',
+    'CMP': 'PA_CMP',
+}
+
+
+def _coluna_usada(nome):
+    nome = str(nome)
+    return any(trecho in nome for trecho in _COLUNAS_USADAS) and 'ULTIMO_DIGITO' not in nome
+
+
+def detectar_separador(file):
+    """Detecta ',' ou ';' pela linha de cabeçalho, sem ler o arquivo todo."""
+    file.seek(0)
+    cabecalho = file.readline()
+    file.seek(0)
+    if isinstance(cabecalho, bytes): cabecalho = cabecalho.decode('latin1')
+    return ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+
+
+def _renomear_padrao(df):
+    """Padroniza os nomes das colunas (ex.: 'PA_VALAPR ' -> 'PA_VALAPR')."""
+    mapa = {}
+    for col in df.columns:
+        for trecho, padrao in _COLUNAS_USADAS.items():
+            if trecho in col and padrao not in mapa.values():
+                mapa[col] = padrao
+                break
+    return df.rename(columns=mapa)
+
+
+def competencia_dos_registros(df):
+    """Competência (AAAAMM) de cada registro, pela COLUNA_COMPETENCIA (ou pela outra, se faltar)."""
+    colunas = {str(c).strip(): c for c in df.columns}
+    for nome in (COLUNA_COMPETENCIA, 'PA_MVM', 'PA_CMP'):
+        if nome in colunas:
+            return normalizar_competencias(df[colunas[nome]])
+    return pd.Series(SEM_COMPETENCIA, index=df.index, dtype='str')
+
+
+def _agregar_bloco(bloco, nat_jur):
+    bloco = _renomear_padrao(bloco)
+    if 'PA_NAT_JUR' in bloco.columns:
+        bloco = bloco[bloco['PA_NAT_JUR'].str.strip() == nat_jur]
+    if bloco.empty:
+        return None
+
+    parcial = pd.DataFrame({
+        'CNES_KEY': bloco['PA_CODUNI'].str.strip().str.replace('"', '').str.zfill(7),
+        'COMPETENCIA': competencia_dos_registros(bloco),
+        'PA_PROC_ID': bloco['PA_PROC_ID'].str.strip() if 'PA_PROC_ID' in bloco.columns else '',
+        'PA_VALAPR': ler_numeros_br(bloco['PA_VALAPR']),
+        'PA_QTDAPR': pd.to_numeric(bloco['PA_QTDAPR'], errors='coerce').fillna(0) if 'PA_QTDAPR' in bloco.columns else 0,
+        'N_REGISTROS': 1,
+    })
+    return parcial.groupby(CHAVES_AGREGACAO, sort=False).sum().reset_index()
+
+
+def ler_papa_em_blocos(file, nat_jur=NAT_JUR_PADRAO, tamanho_bloco=None):
+    """Lê um PAPA em blocos e devolve as parciais agregadas por (CNES_KEY, COMPETENCIA, PA_PROC_ID).
+
+    As colunas de medida são PA_VALAPR (valor aprovado), PA_QTDAPR (quantidade
+    aprovada) e N_REGISTROS (linhas do PAPA que entraram na soma).
+    """
+    sep = detectar_separador(file)
+    leitor = pd.read_csv(
+        file, sep=sep, encoding='latin1', dtype=str,
+        usecols=_coluna_usada, chunksize=tamanho_bloco or TAMANHO_BLOCO,
+    )
+    parciais = [p for p in (_agregar_bloco(bloco, nat_jur) for bloco in leitor) if p is not None]
+    if not parciais:
+        return pd.DataFrame(columns=CHAVES_AGREGACAO + MEDIDAS)
+    # Um mesmo (CNES, competência, procedimento) pode aparecer em vários blocos: consolida no final.
+    return pd.concat(parciais, ignore_index=True).groupby(CHAVES_AGREGACAO, sort=False).sum().reset_index()
+
+
+def agregar_parcial(df, nat_jur=NAT_JUR_PADRAO):
+    """Reduz um PAPA já lido e tipado (uma linha por registro) à parcial por (CNES_KEY, COMPETENCIA, PA_PROC_ID)."""
+    if 'PA_NAT_JUR' in df.columns:
+        df = df[df['PA_NAT_JUR'].astype(str).str.strip() == nat_jur]
+    if df.empty or 'CNES_KEY' not in df.columns:
+        return pd.DataFrame(columns=CHAVES_AGREGACAO + MEDIDAS)
+    col_val = next((c for c in df.columns if 'VALAPR' in c), 'PA_VALAPR')
+    col_qtd = next((c for c in df.columns if 'QTDAPR' in c), None)
+    col_proc = next((c for c in df.columns if 'PROC_ID' in c and 'ULTIMO_DIGITO' not in c), None)
+    parcial = pd.DataFrame({
+        'CNES_KEY': df['CNES_KEY'].astype(str),
+        'COMPETENCIA': df['COMPETENCIA'].astype(str) if 'COMPETENCIA' in df.columns else competencia_dos_registros(df),
+        'PA_PROC_ID': df[col_proc].astype(str).str.strip() if col_proc else '',
+        'PA_VALAPR': df[col_val].astype(float),
+        'PA_QTDAPR': pd.to_numeric(df[col_qtd], errors='coerce').fillna(0) if col_qtd else 0,
+        'N_REGISTROS': 1,
+    })
+    return parcial.groupby(CHAVES_AGREGACAO, sort=False).sum().reset_index()
+
+
+def consolidar_parciais(parciais):
+    """Junta parciais de vários arquivos pela chave (CNES_KEY, COMPETENCIA, PA_PROC_ID)."""
+    parciais = [p for p in parciais if not p.empty]
+    if not parciais:
+        return pd.DataFrame(columns=CHAVES_AGREGACAO + MEDIDAS)
+    return pd.concat(parciais, ignore_index=True).groupby(CHAVES_AGREGACAO, sort=False)[MEDIDAS].sum().reset_index()
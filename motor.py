@@ -0,0 +1,166 @@
+"""Motor de cálculo do dashboard, independente do Streamlit.
+
+Reúne a carga dos arquivos (PAPA/Espelho) e as consultas usadas nas abas, para
+que o app e o processamento em lote (processar_lote.py) calculem exatamente a
+mesma coisa. Também grava e reabre os resultados pré-processados.
+"""
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from catalogo_procedimentos import atualizar_catalogo, extrair_catalogo, nomear_procedimentos
+from compactados import competencia_por_nome
+from consolidacao import processar_consolidado
+from cubo import cnes_disponiveis, competencias_disponiveis, construir_cubo, fatiar, somar_por
+from fontes_cubo import abrir_cubo
+from ingestao import agregar_teto, consolidar_teto, ler_arquivos, parcial_papa, parse_arquivo_espelho
+from leitura_papa import COLUNA_COMPETENCIA, consolidar_parciais, ler_papa_em_blocos
+from periodos import SEM_COMPETENCIA, rotulos_competencias, teto_do_periodo
+
+ARQUIVO_MANIFESTO = 'manifesto.json'
+
+
+def preencher_competencia(parcial, nome_arquivo):
+    """Registros sem competência nos dados recebem a do nome do arquivo (padrão DATASUS, ex.: PAPA2501)."""
+    competencia = competencia_por_nome(nome_arquivo)
+    if competencia and 'COMPETENCIA' in parcial.columns:
+        parcial['COMPETENCIA'] = parcial['COMPETENCIA'].astype(str).replace(SEM_COMPETENCIA, competencia)
+    return parcial
+
+
+# --- CARGA ---
+def carregar_dados(files_papa, files_espelho, leitura_em_blocos=False, workers=1, usar_processos=False):
+    """Lê PAPA e Espelho (uploads ou caminhos) e devolve (cubo, teto, catálogo, tempos de leitura)."""
+    # Cada mês (arquivo ou membro de zip) vira uma parcial agregada, guardada no cache
+    # pelo hash do conteúdo: incluir um mês novo só custa a leitura desse mês.
+    df_papa = pd.DataFrame()
+    tempos = []
+    if files_papa:
+        if leitura_em_blocos:
+            # Modo streaming: só as colunas usadas, filtro 1031 por bloco e parciais já agregadas
+            tipo, parser = 'papa_blocos', ler_papa_em_blocos
+        else:
+            tipo, parser = 'papa_parcial', parcial_papa
+        # As parciais já trazem a competência de cada registro: a coluna usada separa os caches
+        tipo = f"{tipo}_{COLUNA_COMPETENCIA.lower()}"
+        lidos, tempos_papa = ler_arquivos(files_papa, tipo, parser, workers, usar_processos)
+        for nome, parcial in lidos:
+            preencher_competencia(parcial, nome)
+        tempos.append(tempos_papa)
+        df_papa = consolidar_parciais([parcial for _, parcial in lidos])
+
+    df_espelho = pd.DataFrame()
+    teto_agrupado = pd.DataFrame()
+    if files_espelho:
+        target_files = files_espelho if isinstance(files_espelho, list) else [files_espelho]
+        lidos, tempos_espelho = ler_arquivos(target_files, 'espelho', parse_arquivo_espelho, workers, usar_processos)
+        tempos.append(tempos_espelho)
+        espelho_dfs = [df_temp for _, df_temp in lidos]
+        if espelho_dfs:
+            df_espelho = pd.concat(espelho_dfs, ignore_index=True)
+            teto_agrupado = consolidar_teto([agregar_teto(df_temp) for df_temp in espelho_dfs])
+
+    # O PAPA não traz descrição de procedimento: o catálogo vem do Espelho
+    catalogo_proc = atualizar_catalogo(extrair_catalogo(df_espelho)) if not df_espelho.empty else atualizar_catalogo()
+
+    # O dashboard trabalha só com o cubo agregado; o PAPA bruto não fica no cache
+    cubo = construir_cubo(df_papa, teto_agrupado)
+    tempos_leitura = pd.concat(tempos, ignore_index=True) if tempos else pd.DataFrame()
+    return cubo, teto_agrupado, catalogo_proc, tempos_leitura
+
+
+# --- CONSULTAS (usadas pelas abas e pelo lote) ---
+def consolidar_periodo(cubo, df_teto, competencias=None):
+    """Execução por unidade no período, só com as unidades que aparecem no PAPA.
+
+    Valor_Teto é o teto acumulado nas competências do período (o vigente em
+    cada uma); sem competências informadas, vale o período todo do cubo.
+    """
+    if competencias is None: competencias = competencias_disponiveis(cubo)
+    # A produção por unidade é somada no próprio cubo (pandas ou fonte fora da memória)
+    producao = somar_por(fatiar(cubo, competencias=competencias), 'CNES_KEY')
+    df = processar_consolidado(producao, teto_do_periodo(df_teto, competencias))
+    df['Teto_Mensal'] = df['Teto_Mensal'].fillna(0.0)
+    if not cubo.empty:
+        df = df[df['CNES_KEY'].isin(cnes_disponiveis(cubo))]
+    return df
+
+
+def calcular_timeline(cubo_periodo, cnes=None, por_unidade=False, por_ano=False):
+    """Produção por competência (ou por ano), em ordem cronológica; opcionalmente por unidade.
+
+    A soma é feita no cubo (categorias); só o resultado, com uma linha por
+    período, é convertido em texto e rotulado ("Jan/2025").
+    """
+    dimensoes = ['CNES_KEY', 'COMPETENCIA'] if por_unidade else ['COMPETENCIA']
+    timeline = somar_por(fatiar(cubo_periodo, cnes=cnes), dimensoes)
+    timeline['COMPETENCIA'] = timeline['COMPETENCIA'].astype(str)
+    if por_ano:
+        timeline['COMPETENCIA'] = timeline['COMPETENCIA'].str[:4]
+        timeline = timeline.groupby(dimensoes, sort=False)['PA_VALAPR'].sum().reset_index()
+    timeline['Periodo'] = rotulos_competencias(timeline['COMPETENCIA'])
+    return timeline.sort_values(dimensoes[::-1]).reset_index(drop=True)
+
+
+def calcular_top_procedimentos(cubo_periodo, catalogo, cnes=None, n=5):
+    """Os `n` procedimentos de maior valor, já com a descrição do catálogo."""
+    top_proc = somar_por(fatiar(cubo_periodo, cnes=cnes), 'PA_PROC_ID', medidas=('PA_VALAPR', 'PA_QTDAPR'))
+    top_proc = top_proc.sort_values('PA_VALAPR', ascending=False).head(n)
+    top_proc['PA_PROC_ID'] = top_proc['PA_PROC_ID'].astype(str)
+    top_proc['Procedimento'] = nomear_procedimentos(catalogo, top_proc['PA_PROC_ID'])
+    return top_proc
+
+
+# --- RESULTADOS PRÉ-PROCESSADOS ---
+def salvar_resultados(destino, cubo, df_teto, catalogo, top_n=20, extras=None):
+    """Grava, em Parquet, o necessário para o dashboard e os consolidados do período completo."""
+    os.makedirs(destino, exist_ok=True)
+    competencias = competencias_disponiveis(cubo)
+
+    # Valor_Teto e Saldo já são do período completo (teto acumulado por competência)
+    execucao = consolidar_periodo(cubo, df_teto, competencias)
+
+    cubo.to_parquet(os.path.join(destino, 'cubo.parquet'), index=False)
+    df_teto.to_parquet(os.path.join(destino, 'teto.parquet'), index=False)
+    catalogo.to_parquet(os.path.join(destino, 'catalogo.parquet'))
+    execucao.to_parquet(os.path.join(destino, 'execucao_cnes.parquet'), index=False)
+    calcular_timeline(cubo, por_unidade=True).to_parquet(os.path.join(destino, 'timeline.parquet'), index=False)
+    calcular_top_procedimentos(cubo, catalogo, n=top_n).to_parquet(os.path.join(destino, 'top_procedimentos.parquet'), index=False)
+
+    manifesto = {
+        'competencias': competencias,
+        'num_competencias': len(competencias),
+        'unidades': int(len(execucao)),
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        **(extras or {}),
+    }
+    with open(os.path.join(destino, ARQUIVO_MANIFESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    return manifesto
+
+
+def listar_resultados(raiz):
+    """Subpastas de `raiz` que contêm resultados pré-processados (com manifesto)."""
+    if not raiz or not os.path.isdir(raiz):
+        return []
+    if os.path.exists(os.path.join(raiz, ARQUIVO_MANIFESTO)):
+        return [raiz]
+    return sorted(os.path.join(raiz, d) for d in os.listdir(raiz)
+                  if os.path.exists(os.path.join(raiz, d, ARQUIVO_MANIFESTO)))
+
+
+def carregar_resultados(origem, motor=None):
+    """Reabre um resultado salvo por salvar_resultados no mesmo formato de carregar_dados.
+
+    Conforme o tamanho (ou `motor`/SUS_MOTOR_CONSULTA), o cubo volta como
+    DataFrame ou como fonte consultada direto no Parquet (fontes_cubo).
+    """
+    cubo = abrir_cubo(os.path.join(origem, 'cubo.parquet'), motor)
+    if 'COMPETENCIA' not in cubo.columns:
+        raise ValueError(f"{origem}: resultado gerado antes do modelo de competências (AAAAMM); rode o processar_lote.py de novo.")
+    df_teto = pd.read_parquet(os.path.join(origem, 'teto.parquet'), memory_map=True)
+    catalogo = pd.read_parquet(os.path.join(origem, 'catalogo.parquet'), memory_map=True)
+    catalogo.index = catalogo.index.astype('Int64')
+    return cubo, df_teto, catalogo, pd.DataFrame()
@@ -0,0 +1,88 @@
+"""Conversão de números no formato brasileiro ("1.234,56"), coluna inteira por vez.
+
+`ler_numeros_br` é usado na ingestão (PAPA e Espelho) e `formatar_numeros_br` /
+`formatar_brl` em toda a exibição (KPIs, textos dos gráficos e tabelas). As
+duas trabalham sobre a coluna inteira (kernels do Arrow), em vez de converter
+ou formatar célula por célula.
+"""
+from decimal import ROUND_HALF_EVEN, Decimal
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Sinal opcional, "R$" opcional, milhar com ponto (grupos de 3) ou sem milhar, decimais com vírgula
+PADRAO_NUMERO_BR = r'(?:-|-?R\$\s*|R\$\s*-)?(?:\d{1,3}(?:\.\d{3})+|\d+)(?:,\d+)?'
+MOEDA = 'R$ '
+
+
+def ler_numeros_br(serie):
+    """Converte texto BR em float64.
+
+    Aceita "1.234,56", "1234,56", "-10,5", "R$ 1.300,00" e "R$ -5,00". Células vazias e
+    mal formadas (ex.: "12,3,4", "1.23,00", "abc") viram NaN em vez de um valor
+    errado ou de um erro no meio da leitura.
+    """
+    texto = pd.Series(serie, copy=False).astype('str').str.strip()
+    valido = texto.str.fullmatch(PADRAO_NUMERO_BR).fillna(False).astype(bool)
+    negativo = texto.str.contains('-', regex=False).fillna(False).astype(bool)
+    # Com o formato já validado, basta tirar os caracteres que não são dígitos nem a vírgula
+    for trecho in ('R$', ' ', '.', '-'):
+        texto = texto.str.replace(trecho, '', regex=False)
+    valores = texto.str.replace(',', '.', regex=False).where(valido).astype('float64')
+    return valores.where(~negativo, -valores)
+
+
+def _agrupar_milhar_arrow(inteiros):
+    """Parte inteira (int64, não negativa) como texto com ponto a cada 3 dígitos."""
+    texto = pc.utf8_lpad(pc.cast(pa.array(inteiros % 1000), pa.string()), 3, '0')
+    resto = inteiros // 1000
+    while (resto > 0).any():
+        grupo = pc.utf8_lpad(pc.cast(pa.array(resto % 1000), pa.string()), 3, '0')
+        texto = pc.if_else(pa.array(resto > 0), pc.binary_join_element_wise(grupo, texto, '.'), texto)
+        resto = resto // 1000
+    # Os grupos saem completados com zeros; só o primeiro perde os zeros à esquerda
+    texto = pc.utf8_ltrim(texto, '0')
+    return pc.if_else(pc.equal(texto, ''), '0', pc.if_else(pc.starts_with(texto, '.'), pc.binary_join_element_wise('0', texto, ''), texto))
+
+
+def _arredondar(numeros, casas):
+    """|numeros| * 10**casas arredondado como o format do Python ("{:.2f}"): pelo valor binário exato.
+
+    A multiplicação em float erra justo perto do meio-termo (0.005 * 100 dá 0.5
+    exato, 0.015 * 100 dá 1.5) e acima de 2**52, onde já não há casas decimais:
+    esses poucos valores são refeitos em Decimal.
+    """
+    escalado = np.abs(numeros) * 10 ** casas
+    unidades = np.floor(escalado + 0.5).astype(np.int64)
+    fracao = escalado - np.floor(escalado)
+    exato = (np.abs(fracao - 0.5) <= escalado * 1e-15 + 1e-9) | (escalado >= 2 ** 52)
+    for i in np.flatnonzero(exato):
+        unidades[i] = int(abs(Decimal(float(numeros[i]))).scaleb(casas).quantize(Decimal(1), rounding=ROUND_HALF_EVEN))
+    return unidades
+
+
+def formatar_numeros_br(valores, casas=2, milhar=True, prefixo=''):
+    """Formata números como texto BR. NaN e infinitos viram zero, como no formatar_brl antigo."""
+    serie = pd.Series(valores, copy=False)
+    numeros = pd.to_numeric(serie, errors='coerce').astype('float64').to_numpy()
+    numeros = np.where(np.isfinite(numeros), numeros, 0.0)
+    escala = 10 ** casas
+    unidades = _arredondar(numeros, casas)
+    # Arredondado para zero não leva sinal ("-0,00")
+    sinal = np.where((numeros < 0) & (unidades > 0), '-', '')
+    inteiros = unidades // escala
+    texto = _agrupar_milhar_arrow(inteiros) if milhar else pc.cast(pa.array(inteiros), pa.string())
+    if casas:
+        decimais = pc.utf8_lpad(pc.cast(pa.array(unidades % escala), pa.string()), casas, '0')
+        texto = pc.binary_join_element_wise(texto, decimais, ',')
+    texto = pc.binary_join_element_wise(prefixo, pa.array(sinal, pa.string()), texto, '')
+    return pd.Series(texto.to_pandas(), index=serie.index, dtype='str')
+
+
+def formatar_brl(valor):
+    """Moeda no padrão BR ("R$ 1.234,56", "R$ -50,00"). Aceita um número ou uma Series/array."""
+    if np.ndim(valor) == 0:
+        return formatar_numeros_br([valor], prefixo=MOEDA).iloc[0]
+    return formatar_numeros_br(valor, prefixo=MOEDA)
@@ -0,0 +1,97 @@
+"""Modelo de período do dashboard: competências no formato AAAAMM.
+
+A produção é indexada pela competência lida dos próprios registros (PA_MVM,
+ou PA_CMP se configurado) e o teto pela coluna Competência do Espelho. O teto
+de um período é a soma, competência a competência, do teto vigente em cada uma
+(o Espelho mais recente até aquela competência), em vez de "teto x número de
+arquivos". Assim o eixo do tempo pode atravessar vários anos.
+"""
+import numpy as np
+import pandas as pd
+
+MESES = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho', 'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
+MESES_ABREV = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+# Registros sem competência reconhecível (nem nos dados, nem no nome do arquivo)
+SEM_COMPETENCIA = '000000'
+
+
+def normalizar_competencias(serie):
+    """Converte "202501", "2025-01", "01/2025" etc. em "AAAAMM". O que não for reconhecido vira SEM_COMPETENCIA.
+
+    A coluna tem poucos valores distintos (um por mês): a conversão é feita neles e depois mapeada.
+    """
+    serie = pd.Series(serie, copy=False).astype('str')
+    unicos = pd.Series(serie.unique()).astype('str')
+    texto = unicos.str.strip()
+    aaaamm = texto.str.extract(r'^(\d{4})[-/]?(\d{2})')
+    mmaaaa = texto.str.extract(r'^(\d{2})[-/](\d{4})')
+    ano = aaaamm[0].fillna(mmaaaa[1])
+    mes = aaaamm[1].fillna(mmaaaa[0])
+    valido = pd.to_numeric(mes, errors='coerce').between(1, 12).fillna(False).astype(bool)
+    convertidos = (ano + mes).where(valido, SEM_COMPETENCIA).astype('str')
+    return serie.map(dict(zip(unicos.fillna(''), convertidos))).fillna(SEM_COMPETENCIA).astype('str')
+
+
+def ordenar_competencias(competencias):
+    return sorted(str(c) for c in competencias)
+
+
+def rotulo_competencia(competencia):
+    """"202501" -> "Jan/2025"; um ano ("2025") fica como está."""
+    competencia = str(competencia)
+    if competencia == SEM_COMPETENCIA: return "Sem competência"
+    if len(competencia) != 6: return competencia
+    return f"{MESES_ABREV[int(competencia[4:]) - 1]}/{competencia[:4]}"
+
+
+def rotulos_competencias(serie):
+    """rotulo_competencia para uma coluna inteira (calcula uma vez por valor distinto)."""
+    serie = pd.Series(serie, copy=False).astype('str')
+    unicos = serie.unique()
+    return serie.map(dict(zip(unicos, map(rotulo_competencia, unicos))))
+
+
+def competencias_vigentes(competencias_teto, competencias):
+    """Para cada competência pedida, a competência do Espelho que vale para ela.
+
+    Vale o Espelho mais recente até a competência; antes do primeiro Espelho,
+    vale o primeiro.
+    """
+    teto = np.asarray(sorted(competencias_teto))
+    posicao = np.searchsorted(teto, np.asarray(list(competencias), dtype=str), side='right') - 1
+    return teto[np.clip(posicao, 0, None)]
+
+
+def unidades_vigentes(df_teto):
+    """Nome de cada unidade (CNES_KEY -> Unidade) no Espelho mais recente."""
+    if df_teto.empty:
+        return pd.Series(dtype=object)
+    if 'COMPETENCIA' in df_teto.columns:
+        df_teto = df_teto.sort_values('COMPETENCIA', kind='stable')
+    return df_teto.drop_duplicates('CNES_KEY', keep='last').set_index('CNES_KEY')['Unidade']
+
+
+def teto_do_periodo(df_teto, competencias=None):
+    """Teto por unidade no período: Valor_Teto (soma nas competências) e Teto_Mensal (vigente na última).
+
+    `df_teto` tem uma linha por (CNES_KEY, Unidade, COMPETENCIA). Sem
+    competências informadas (None), usa só o Espelho mais recente (um mês);
+    com a seleção vazia ([]), o teto do período é zero.
+    """
+    if df_teto.empty:
+        return pd.DataFrame(columns=['CNES_KEY', 'Unidade', 'Valor_Teto', 'Teto_Mensal'])
+    if 'COMPETENCIA' not in df_teto.columns:
+        df_teto = df_teto.assign(COMPETENCIA=SEM_COMPETENCIA)
+    tabela = df_teto.pivot_table(index='CNES_KEY', columns='COMPETENCIA', values='Valor_Teto', aggfunc='sum', fill_value=0.0, observed=True)
+    tabela.columns = tabela.columns.astype(str)
+    competencias = [tabela.columns.max()] if competencias is None else ordenar_competencias(competencias)
+    vigentes = competencias_vigentes(tabela.columns, competencias)
+    # Quantas vezes cada Espelho entra na soma do período
+    pesos = pd.Series(vigentes, dtype=str).value_counts().reindex(tabela.columns, fill_value=0)
+    resultado = pd.DataFrame({
+        'CNES_KEY': tabela.index.astype(str),
+        'Valor_Teto': tabela.to_numpy(dtype=float) @ pesos.to_numpy(dtype=float),
+        'Teto_Mensal': tabela[vigentes[-1]].to_numpy(dtype=float) if len(vigentes) else 0.0,
+    })
+    resultado.insert(1, 'Unidade', resultado['CNES_KEY'].map(unidades_vigentes(df_teto)))
+    return resultado
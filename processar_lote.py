@@ -0,0 +1,95 @@
+"""Processamento em lote (sem Streamlit) dos arquivos PAPA/Espelho.
+
+Uso:
+    # Um município
+    python processar_lote.py --papa dados/belem/papa --espelho dados/belem/espelho --saida resultados/belem
+
+    # Vários municípios: cada subpasta de --raiz tem as pastas papa/ e espelho/
+    python processar_lote.py --raiz dados/ --saida resultados/ --workers 4
+
+Os resultados (Parquet + manifesto.json) podem ser abertos direto no dashboard,
+em "Resultados pré-processados".
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from compactados import EXTENSOES_COMPACTADAS
+from motor import carregar_dados, salvar_resultados
+
+EXTENSOES_DADOS = ('.csv',) + EXTENSOES_COMPACTADAS
+
+
+def listar_arquivos(pasta):
+    if not os.path.isdir(pasta):
+        return []
+    return sorted(os.path.join(pasta, f) for f in os.listdir(pasta)
+                  if f.lower().endswith(EXTENSOES_DADOS) and os.path.isfile(os.path.join(pasta, f)))
+
+
+def processar_municipio(nome, pasta_papa, pasta_espelho, destino, leitura_em_blocos=True, top_n=20):
+    """Carrega, consolida e grava os resultados de um município; retorna o manifesto."""
+    inicio = time.perf_counter()
+    files_papa, files_espelho = listar_arquivos(pasta_papa), listar_arquivos(pasta_espelho)
+    if not files_papa or not files_espelho:
+        raise FileNotFoundError(f"{nome}: é preciso ao menos um arquivo em {pasta_papa} e em {pasta_espelho}")
+
+    cubo, df_teto, catalogo, tempos = carregar_dados(files_papa, files_espelho, leitura_em_blocos=leitura_em_blocos)
+    extras = {
+        'municipio': nome,
+        'arquivos_papa': [os.path.basename(f) for f in files_papa],
+        'arquivos_espelho': [os.path.basename(f) for f in files_espelho],
+        'segundos_leitura': round(float(tempos['Segundos'].sum()), 3) if not tempos.empty else 0.0,
+    }
+    manifesto = salvar_resultados(destino, cubo, df_teto, catalogo, top_n=top_n, extras=extras)
+    manifesto['segundos_total'] = round(time.perf_counter() - inicio, 3)
+    return manifesto
+
+
+def _tarefas(args):
+    if args.raiz:
+        for nome in sorted(os.listdir(args.raiz)):
+            pasta = os.path.join(args.raiz, nome)
+            if os.path.isdir(os.path.join(pasta, 'papa')):
+                yield nome, os.path.join(pasta, 'papa'), os.path.join(pasta, 'espelho'), os.path.join(args.saida, nome)
+    else:
+        nome = os.path.basename(os.path.normpath(args.saida))
+        yield nome, args.papa, args.espelho, args.saida
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-processa PAPA/Espelho para o dashboard SIA/SUS.")
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument('--raiz', help="pasta com uma subpasta por município (cada uma com papa/ e espelho/)")
+    origem.add_argument('--papa', help="pasta com os arquivos PAPA de um município")
+    parser.add_argument('--espelho', help="pasta com os Espelhos (obrigatória com --papa)")
+    parser.add_argument('--saida', required=True, help="pasta de destino dos resultados")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="municípios processados em paralelo")
+    parser.add_argument('--top', type=int, default=20, help="quantidade de procedimentos no ranking")
+    parser.add_argument('--leitura-completa', action='store_true', help="lê o PAPA inteiro em vez de em blocos")
+    args = parser.parse_args(argv)
+    if args.papa and not args.espelho:
+        parser.error("--espelho é obrigatório junto com --papa")
+
+    tarefas = list(_tarefas(args))
+    if not tarefas:
+        parser.error("nenhum município encontrado")
+
+    falhas = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(tarefas)))) as pool:
+        futuros = {pool.submit(processar_municipio, *t, leitura_em_blocos=not args.leitura_completa, top_n=args.top): t[0] for t in tarefas}
+        for fut in as_completed(futuros):
+            nome = futuros[fut]
+            try:
+                m = fut.result()
+                print(f"[ok] {nome}: {m['num_competencias']} competência(s), {m['unidades']} unidades em {m['segundos_total']:.1f}s")
+            except Exception as e:
+                falhas += 1
+                print(f"[erro] {nome}: {e}", file=sys.stderr)
+    return 1 if falhas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Registro compartilhado de conjuntos de dados (modo servidor, várias sessões).
+
+Um conjunto (cubo, teto, catálogo) é identificado pelo hash do conteúdo dos
+arquivos que o formam: quem envia os mesmos PAPA/Espelho chega ao mesmo ID,
+o processamento acontece uma vez e todas as sessões usam a mesma cópia em
+memória. A sessão não guarda cópia: a cada rerun pede o conjunto pelo ID.
+
+Os conjuntos também ficam gravados em Parquet em DIR_CACHE/conjuntos/<id>, no
+mesmo formato dos resultados pré-processados, e são reabertos (memory-map) se
+saírem da memória ou se o servidor reiniciar. Em memória ficam no máximo
+SUS_REGISTRO_MAX_CONJUNTOS conjuntos (padrão 8); os usados há mais tempo saem
+primeiro.
+
+Os DataFrames devolvidos são compartilhados: quem recebe não deve alterá-los.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+from cache_colunar import DIR_CACHE, VERSAO_CACHE, cache_disponivel, gravar_parquet
+from fontes_cubo import abrir_cubo, escolher_motor, nome_motor
+from leitura_papa import COLUNA_COMPETENCIA
+from motor import carregar_resultados
+
+MAX_CONJUNTOS_PADRAO = int(os.environ.get("SUS_REGISTRO_MAX_CONJUNTOS", "8") or 8)
+
+
+def id_conjunto(*grupos_hashes):
+    """ID do conjunto a partir dos hashes de conteúdo (PAPA, Espelho...). A ordem dos arquivos não importa.
+
+    A coluna de competência entra no ID: ela decide o período de cada registro.
+    """
+    h = hashlib.sha256(f"v{VERSAO_CACHE}|{COLUNA_COMPETENCIA}".encode())
+    for grupo in grupos_hashes:
+        h.update(("|" + ",".join(sorted(grupo))).encode())
+    return h.hexdigest()[:24]
+
+
+def pasta_conjunto(id_conj):
+    return os.path.join(DIR_CACHE, f"v{VERSAO_CACHE}", "conjuntos", id_conj)
+
+
+def salvar_conjunto(destino, cubo, df_teto, catalogo):
+    """Grava o conjunto no formato lido por motor.carregar_resultados."""
+    gravar_parquet(df_teto, os.path.join(destino, 'teto.parquet'))
+    gravar_parquet(catalogo, os.path.join(destino, 'catalogo.parquet'), index=True)
+    # O cubo por último: a presença dele marca o conjunto como completo
+    gravar_parquet(cubo, os.path.join(destino, 'cubo.parquet'))
+
+
+class RegistroDados:
+    """Conjuntos carregados, por ID, compartilhados entre as sessões do processo."""
+
+    def __init__(self, max_conjuntos=MAX_CONJUNTOS_PADRAO):
+        self.max_conjuntos = max_conjuntos
+        self._conjuntos = OrderedDict()
+        self._lock = threading.Lock()
+        self._locks_carga = {}
+
+    @contextmanager
+    def _carga(self, id_conj):
+        """Lock de carga do ID; a entrada sai do dicionário quando ninguém mais usa ou espera por ela."""
+        with self._lock:
+            entrada = self._locks_carga.setdefault(id_conj, [threading.Lock(), 0])
+            entrada[1] += 1
+        try:
+            with entrada[0]:
+                yield
+        finally:
+            with self._lock:
+                entrada[1] -= 1
+                if entrada[1] == 0:
+                    del self._locks_carga[id_conj]
+
+    def _guardar(self, id_conj, dados):
+        with self._lock:
+            self._conjuntos[id_conj] = dados
+            self._conjuntos.move_to_end(id_conj)
+            while len(self._conjuntos) > self.max_conjuntos:
+                self._conjuntos.popitem(last=False)
+
+    def _em_memoria(self, id_conj):
+        with self._lock:
+            if id_conj in self._conjuntos:
+                self._conjuntos.move_to_end(id_conj)
+                return self._conjuntos[id_conj]
+        return None
+
+    def obter(self, id_conj, carregar):
+        """(cubo, teto, catálogo, tempos) do conjunto, processando com `carregar()` só se for novo.
+
+        Sessões que pedem o mesmo ID ao mesmo tempo esperam a primeira carga em
+        vez de processar os arquivos de novo.
+        """
+        dados = self._em_memoria(id_conj)
+        if dados is not None:
+            return dados
+        with self._carga(id_conj):
+            dados = self._em_memoria(id_conj)
+            if dados is not None:
+                return dados
+            destino = pasta_conjunto(id_conj)
+            if cache_disponivel() and os.path.exists(os.path.join(destino, 'cubo.parquet')):
+                try:
+                    dados = carregar_resultados(destino)
+                except Exception:
+                    dados = None  # Conjunto gravado ilegível: processa de novo.
+            if dados is None:
+                dados = carregar()
+                if cache_disponivel():
+                    try:
+                        salvar_conjunto(destino, *dados[:3])
+                        # Cubo grande: as consultas passam a varrer o Parquet e o DataFrame é liberado
+                        arquivo_cubo = os.path.join(destino, 'cubo.parquet')
+                        if escolher_motor(os.path.getsize(arquivo_cubo)) != 'pandas':
+                            dados = (abrir_cubo(arquivo_cubo),) + tuple(dados[1:])
+                    except Exception:
+                        pass  # Falha ao gravar não deve impedir o uso em memória.
+            self._guardar(id_conj, dados)
+            return dados
+
+    def obter_resultado(self, origem):
+        """Resultado pré-processado (processar_lote.py), também compartilhado entre sessões."""
+        manifesto = os.path.join(origem, 'manifesto.json')
+        marca = os.path.getmtime(manifesto) if os.path.exists(manifesto) else 0
+        id_conj = "resultado:" + hashlib.sha256(f"{os.path.abspath(origem)}|{marca}".encode()).hexdigest()[:24]
+        return id_conj, self._em_memoria(id_conj) or self._carregar_resultado(id_conj, origem)
+
+    def _carregar_resultado(self, id_conj, origem):
+        with self._carga(id_conj):
+            dados = self._em_memoria(id_conj)
+            if dados is None:
+                dados = carregar_resultados(origem)
+                self._guardar(id_conj, dados)
+            return dados
+
+    def resumo(self):
+        """Conjuntos em memória com motor, linhas e MB do cubo, para o painel de administração."""
+        with self._lock:
+            itens = list(self._conjuntos.items())
+        return pd.DataFrame([{
+            'conjunto': id_conj[:16],
+            'motor': nome_motor(dados[0]),
+            'linhas_cubo': len(dados[0]),
+            # Cubo fora da memória não conta: fica no Parquet
+            'memoria_mb': round(((dados[0].memory_usage(deep=True).sum() if isinstance(dados[0], pd.DataFrame) else 0) + dados[1].memory_usage(deep=True).sum()) / 1e6, 1),
+        } for id_conj, dados in itens], columns=['conjunto', 'motor', 'linhas_cubo', 'memoria_mb'])
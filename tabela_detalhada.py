@@ -0,0 +1,28 @@
+"""Paginação, busca e ordenação (no servidor) da tabela de Dados Detalhados.
+
+Só a página visível é formatada e enviada ao navegador; a busca e a
+ordenação são feitas aqui, sobre os valores numéricos, antes do recorte.
+"""
+import math
+
+TAMANHOS_PAGINA = [25, 50, 100, 250]
+
+
+def filtrar_ordenar(df, busca="", coluna_ordem=None, crescente=False, coluna_busca='Unidade'):
+    """Aplica a busca por texto (sem diferenciar maiúsculas) e a ordenação."""
+    if busca:
+        df = df[df[coluna_busca].astype(str).str.contains(busca.strip(), case=False, regex=False, na=False)]
+    if coluna_ordem and coluna_ordem in df.columns:
+        df = df.sort_values(coluna_ordem, ascending=crescente, kind='stable')
+    return df
+
+
+def total_paginas(num_linhas, tamanho_pagina):
+    return max(1, math.ceil(num_linhas / tamanho_pagina))
+
+
+def recortar_pagina(df, pagina, tamanho_pagina):
+    """Retorna as linhas da página (1-based), limitando a página ao intervalo válido."""
+    pagina = min(max(1, int(pagina)), total_paginas(len(df), tamanho_pagina))
+    inicio = (pagina - 1) * tamanho_pagina
+    return df.iloc[inicio:inicio + tamanho_pagina], inicio
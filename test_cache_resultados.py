@@ -0,0 +1,57 @@
+"""LRU do cache de visões: limites por entradas e por memória.
+
+Uso:
+    python -m pytest -q test_cache_resultados.py
+"""
+import pandas as pd
+
+from cache_resultados import CacheResultados, normalizar_filtros, tamanho_aproximado
+
+
+def _visao(linhas):
+    return pd.DataFrame({'v': range(linhas)}, dtype='int64')
+
+
+def _chaves(cache):
+    return [nome for _, _, nome in cache._entradas]
+
+
+def test_reaproveita_e_conta_acertos():
+    cache = CacheResultados(limite_mb=1, limite_entradas=4)
+    chamadas = []
+    calcular = lambda: chamadas.append(1) or _visao(3)
+    primeira = cache.obter('v1', normalizar_filtros(['202502', '202501']), 'consolidado', calcular)
+    # A ordem da seleção não muda a chave
+    segunda = cache.obter('v1', normalizar_filtros(['202501', '202502']), 'consolidado', calcular)
+    assert segunda is primeira and len(chamadas) == 1
+    assert cache.estatisticas()['acertos'] == 1 and cache.estatisticas()['falhas'] == 1
+
+
+def test_descarta_por_entradas():
+    cache = CacheResultados(limite_mb=1, limite_entradas=2)
+    cache.obter('v1', (), 'a', lambda: _visao(1))
+    cache.obter('v1', (), 'b', lambda: _visao(1))
+    cache.obter('v1', (), 'a', lambda: _visao(1))  # 'a' passa a ser a mais recente
+    cache.obter('v1', (), 'c', lambda: _visao(1))
+    assert _chaves(cache) == ['a', 'c']
+    assert cache.estatisticas()['descartes'] == 1
+
+
+def test_descarta_por_memoria():
+    tamanho = tamanho_aproximado(_visao(10_000))
+    cache = CacheResultados(limite_mb=2.5 * tamanho / 1e6, limite_entradas=100)
+    for nome in 'abc':
+        cache.obter('v1', (), nome, lambda: _visao(10_000))
+    assert _chaves(cache) == ['b', 'c']
+    assert cache.bytes == 2 * tamanho <= cache.limite_bytes
+    # Maior que o limite inteiro: devolvido, mas não guardado
+    grande = cache.obter('v1', (), 'grande', lambda: _visao(40_000))
+    assert len(grande) == 40_000 and _chaves(cache) == ['b', 'c']
+
+
+def test_limpar():
+    cache = CacheResultados(limite_mb=1, limite_entradas=4)
+    cache.obter('v1', (), 'a', lambda: _visao(1))
+    cache.limpar()
+    assert cache.estatisticas()['entradas'] == 0 and cache.bytes == 0
+    assert cache.estatisticas()['falhas'] == 1
@@ -0,0 +1,66 @@
+"""Catálogo de procedimentos: chave canônica e persistência com cargas em paralelo.
+
+Uso:
+    python -m pytest -q test_catalogo_procedimentos.py
+"""
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+import catalogo_procedimentos
+from catalogo_procedimentos import atualizar_catalogo, carregar_catalogo_persistido, chave_sigtap, nomear_procedimentos
+
+
+@pytest.fixture(autouse=True)
+def pasta_catalogos(tmp_path, monkeypatch):
+    # DIR_CACHE é lido no import: a pasta do teste entra direto no módulo
+    monkeypatch.setattr(catalogo_procedimentos, 'PASTA_CATALOGOS', str(tmp_path))
+    monkeypatch.delenv('SUS_CACHE_DESATIVADO', raising=False)
+    return tmp_path
+
+
+def catalogo(**descricoes):
+    """catalogo(p301010072='CONSULTA') -> catálogo com o código 301010072."""
+    return pd.DataFrame({'Procedimento': list(descricoes.values())},
+                        index=pd.Index([int(c[1:]) for c in descricoes], dtype='Int64', name='CODIGO'))
+
+
+def test_chave_canonica():
+    assert chave_sigtap(['010101002', '0010101002', '10101002', 'abc']).tolist() == [10101002, 10101002, 10101002, pd.NA]
+    nomes = nomear_procedimentos(catalogo(p10101002='ATIVIDADE'), pd.Series(['0010101002', '999']))
+    assert nomes.tolist() == ['ATIVIDADE', 'Proc. 999']
+
+
+def test_persiste_entre_cargas():
+    atualizar_catalogo(catalogo(p1='A', p2='B'))
+    assert atualizar_catalogo().to_dict()['Procedimento'] == {1: 'A', 2: 'B'}
+
+
+def test_ultima_descricao_lida_prevalece():
+    antigo, novo = catalogo(p1='ANTIGA'), catalogo(p1='NOVA')
+    assert atualizar_catalogo(antigo).loc[1, 'Procedimento'] == 'ANTIGA'
+    assert atualizar_catalogo(novo).loc[1, 'Procedimento'] == 'NOVA'
+    # Reler o Espelho antigo volta a valer a descrição dele
+    assert atualizar_catalogo(antigo).loc[1, 'Procedimento'] == 'ANTIGA'
+    assert carregar_catalogo_persistido().loc[1, 'Procedimento'] == 'ANTIGA'
+
+
+def test_cargas_em_paralelo_nao_perdem_atualizacoes():
+    cargas = [threading.Thread(target=atualizar_catalogo, args=(catalogo(**{f"p{i}": f"PROC {i}"}),)) for i in range(1, 17)]
+    for c in cargas: c.start()
+    for c in cargas: c.join()
+    assert sorted(carregar_catalogo_persistido().index) == list(range(1, 17))
+
+
+def test_compacta_sem_perder_a_ordem(pasta_catalogos, monkeypatch):
+    monkeypatch.setattr(catalogo_procedimentos, 'MAX_ARQUIVOS_CATALOGO', 3)
+    for i in range(1, 5):
+        atualizar_catalogo(catalogo(**{f"p{i}": f"PROC {i}", 'p99': f"VERSAO {i}"}))
+    # A quarta carga passou do limite e juntou os quatro arquivos num só
+    assert len(os.listdir(pasta_catalogos)) == 1
+    persistido = carregar_catalogo_persistido()
+    assert sorted(persistido.index) == [1, 2, 3, 4, 99] and persistido.loc[99, 'Procedimento'] == 'VERSAO 4'
+    # Gravado depois da compactação continua valendo sobre ela
+    assert atualizar_catalogo(catalogo(p99='VERSAO 6')).loc[99, 'Procedimento'] == 'VERSAO 6'
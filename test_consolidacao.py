@@ -0,0 +1,108 @@
+"""Consolidação e classificação de unidades iguais às da versão antiga (apply por linha).
+
+Usa o espelho_teto_total.csv da raiz. As referências antigas ficam aqui e o
+benchmarks/bench_consolidacao.py as importa para medir o ganho.
+
+Uso:
+    python -m pytest -q test_consolidacao.py
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from consolidacao import CATEGORIA_OUTROS, MIN_NOMES_ARROW, ClassificadorUnidades, normalizar_texto, processar_consolidado
+from numeros_br import ler_numeros_br
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+# A amostra (~150 unidades) fica abaixo de MIN_NOMES_ARROW; 8 cópias passam do limite
+ESCALAS = [1, 8]
+
+
+def classificar_unidade_legado(nome):
+    """Cadeia de testes anterior, aplicada nome a nome."""
+    nome = normalizar_texto.__wrapped__(nome)
+    if 'UPA' in nome: return '🚨 UPA'
+    if 'HOSP' in nome or 'SANTA CASA' in nome: return '🏥 HOSPITAL'
+    if 'UMS' in nome: return '🩺 UMS'
+    if 'UBS' in nome: return '💉 UBS'
+    if 'ESF' in nome: return '👩‍⚕️ ESF'
+    if 'CENTRO' in nome: return '🏢 CENTRO'
+    return '📍 OUTROS'
+
+
+def processar_consolidado_legado(df_papa_filtrado, df_teto):
+    """Implementação anterior, mantida como referência de tempo e resultado."""
+    if df_papa_filtrado.empty:
+        final = df_teto.copy(); final['Valor_Produzido'] = 0.0
+    else:
+        col_val = next((c for c in df_papa_filtrado.columns if 'VALAPR' in c), 'PA_VALAPR')
+        prod = df_papa_filtrado.groupby('CNES_KEY')[col_val].sum().reset_index()
+        prod.rename(columns={col_val: 'Valor_Produzido'}, inplace=True)
+        final = pd.merge(df_teto, prod, on='CNES_KEY', how='outer').fillna(0)
+
+    final['Unidade'] = final['Unidade'].replace(0, 'Unidade Desconhecida').replace('0', 'Unidade Desconhecida').astype(str)
+    final['Saldo'] = final['Valor_Teto'] - final['Valor_Produzido']
+    final['% Execucao'] = final.apply(lambda x: (x['Valor_Produzido'] / x['Valor_Teto'] * 100) if x['Valor_Teto'] > 0 else 0, axis=1)
+    final['Categoria'] = final['Unidade'].apply(classificar_unidade_legado)
+    return final
+
+
+def carregar_teto(escala=1):
+    """Teto por unidade do Espelho da raiz, replicado `escala` vezes com CNES e nomes novos."""
+    esp = pd.read_csv(os.path.join(RAIZ, 'espelho_teto_total.csv'), encoding='latin1', dtype=str)
+    esp['Valor_Teto'] = ler_numeros_br(esp.iloc[:, 8])
+    esp['CNES_KEY'] = esp.iloc[:, 11].str.strip().str.zfill(7)
+    teto = esp.groupby(['CNES_KEY', esp.columns[12]])['Valor_Teto'].sum().reset_index()
+    teto.columns = ['CNES_KEY', 'Unidade', 'Valor_Teto']
+    copias = []
+    for i in range(escala):
+        c = teto.copy()
+        c['CNES_KEY'] = (c['CNES_KEY'].astype(int) + i * 10_000_000).astype(str).str.zfill(7)
+        # Nomes distintos por cópia, como num Espelho estadual com milhares de estabelecimentos
+        if i: c['Unidade'] = c['Unidade'] + f" {i}"
+        copias.append(c)
+    return pd.concat(copias, ignore_index=True)
+
+
+def gerar_producao(teto, linhas_por_unidade, seed=42):
+    rng = np.random.default_rng(seed)
+    cnes = np.repeat(teto['CNES_KEY'].to_numpy(), linhas_por_unidade)
+    return pd.DataFrame({'CNES_KEY': cnes, 'PA_VALAPR': rng.gamma(2.0, 50.0, len(cnes)).round(2)})
+
+
+@pytest.mark.parametrize('escala', ESCALAS)
+def test_consolidado_igual_ao_legado(escala):
+    teto = carregar_teto(escala)
+    # Produção de unidades fora do Espelho entra com teto zero e "Unidade Desconhecida"
+    papa = pd.concat([gerar_producao(teto, 5), pd.DataFrame({'CNES_KEY': ['9999999'], 'PA_VALAPR': [10.0]})], ignore_index=True)
+    for producao in (papa, papa.iloc[:0]):
+        novo = processar_consolidado(producao, teto).reset_index(drop=True)
+        antigo = processar_consolidado_legado(producao, teto).reset_index(drop=True)
+        pd.testing.assert_frame_equal(novo, antigo, check_dtype=False)
+
+
+@pytest.mark.parametrize('escala', ESCALAS)
+def test_classificacao_igual_ao_legado(escala):
+    nomes = carregar_teto(escala)['Unidade']
+    esperado = nomes.apply(classificar_unidade_legado).tolist()
+    classificador = ClassificadorUnidades()
+    # Segunda chamada vem dos nomes memorizados
+    assert classificador.classificar_varios(nomes).tolist() == esperado
+    assert classificador.classificar_varios(nomes).tolist() == esperado
+
+
+@pytest.mark.parametrize('repeticoes', [1, MIN_NOMES_ARROW])
+def test_acentos_e_nulos(repeticoes):
+    nomes = pd.Series(['Hospital São José', None, 'posto ubs', 'CENTRO COM UPA', 'Unidade'] * repeticoes)
+    esperado = ['🏥 HOSPITAL', CATEGORIA_OUTROS, '💉 UBS', '🚨 UPA', CATEGORIA_OUTROS] * repeticoes
+    assert ClassificadorUnidades().classificar_varios(nomes).tolist() == esperado
+
+
+def test_regras_personalizadas():
+    nomes = pd.Series(['Clínica Norte', 'POLICLINICA SUL', 'UBS'], index=[10, 20, 30], name='Unidade')
+    classificado = ClassificadorUnidades({'Clínicas': ['clínica'], 'Vazia': []}).classificar_varios(nomes)
+    assert classificado.tolist() == ['Clínicas', 'Clínicas', CATEGORIA_OUTROS]
+    assert classificado.index.tolist() == [10, 20, 30] and classificado.name == 'Unidade'
+    assert ClassificadorUnidades({}).classificar_varios(nomes).tolist() == [CATEGORIA_OUTROS] * 3
@@ -0,0 +1,83 @@
+"""Os motores fora da memória (Arrow, DuckDB) dão o mesmo resultado que o pandas.
+
+Usa a amostra da raiz (papa_janeiro.csv e espelho_teto_total.csv). O DuckDB é
+opcional: sem ele, os casos dele são pulados.
+
+Uso:
+    python -m pytest -q test_fontes_cubo.py
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from cubo import competencias_disponiveis, fatiar
+from fontes_cubo import motores_disponiveis
+from motor import calcular_timeline, calcular_top_procedimentos, carregar_dados, carregar_resultados, consolidar_periodo, salvar_resultados
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+MOTORES = [pytest.param(m, marks=pytest.mark.skipif(m not in motores_disponiveis(), reason=f"{m} não instalado")) for m in ('arrow', 'duckdb')]
+
+
+def consultas(cubo, df_teto, catalogo):
+    """As consultas do dashboard, com a seleção completa e com seleções vazias."""
+    competencias = competencias_disponiveis(cubo)
+    cubo_periodo = fatiar(cubo, competencias=competencias)
+    sem_periodo = fatiar(cubo, competencias=[])
+    sem_unidades = fatiar(cubo, cnes=[])
+    return {
+        'competencias': pd.DataFrame({'c': competencias}, dtype=str),
+        'consolidacao': consolidar_periodo(cubo, df_teto, competencias).sort_values('CNES_KEY').reset_index(drop=True),
+        'evolucao': calcular_timeline(cubo_periodo),
+        'evolucao_unidade': calcular_timeline(cubo_periodo, por_unidade=True),
+        'top_procedimentos': calcular_top_procedimentos(cubo_periodo, catalogo, n=20).reset_index(drop=True),
+        'vazio/registros': pd.DataFrame({'n': [len(cubo_periodo), len(sem_periodo), len(sem_unidades)]}),
+        'vazio/competencias': pd.DataFrame({'c': competencias_disponiveis(sem_periodo)}, dtype=str),
+        'vazio/consolidacao': consolidar_periodo(cubo, df_teto, []).sort_values('CNES_KEY').reset_index(drop=True),
+        'vazio/evolucao': calcular_timeline(sem_periodo),
+        'vazio/evolucao_unidades': calcular_timeline(sem_unidades, por_unidade=True),
+        'vazio/top_procedimentos': calcular_top_procedimentos(sem_unidades, catalogo, n=20).reset_index(drop=True),
+    }
+
+
+def normalizar(df):
+    """Texto nas dimensões e centavos nas medidas, para comparar motores."""
+    df = df.copy()
+    for c in df.columns:
+        df[c] = df[c].round(2) if pd.api.types.is_float_dtype(df[c]) else df[c].astype(str)
+    return df
+
+
+@pytest.fixture(scope='module')
+def resultados(tmp_path_factory):
+    pasta = str(tmp_path_factory.mktemp('resultados'))
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("SUS_CACHE_DESATIVADO", "1")
+        cubo, df_teto, catalogo, _ = carregar_dados([os.path.join(RAIZ, 'papa_janeiro.csv')], [os.path.join(RAIZ, 'espelho_teto_total.csv')], leitura_em_blocos=True)
+    salvar_resultados(pasta, cubo, df_teto, catalogo)
+    return pasta
+
+
+@pytest.fixture(scope='module')
+def referencia(resultados):
+    return consultas(*carregar_resultados(resultados, motor='pandas')[:3])
+
+
+@pytest.mark.parametrize('motor', MOTORES)
+def test_motor_igual_ao_pandas(resultados, referencia, motor):
+    cubo, df_teto, catalogo, _ = carregar_resultados(resultados, motor=motor)
+    assert not isinstance(cubo, pd.DataFrame)
+    for nome, df in consultas(cubo, df_teto, catalogo).items():
+        pd.testing.assert_frame_equal(normalizar(df), normalizar(referencia[nome]), check_dtype=False, obj=f"{motor}/{nome}")
+
+
+@pytest.mark.parametrize('motor', MOTORES)
+def test_fatiar_acumula_filtros(resultados, motor):
+    cubo = carregar_resultados(resultados, motor=motor)[0]
+    competencia = competencias_disponiveis(cubo)[0]
+    cnes = list(cubo.cnes()[:3])
+    fatia = fatiar(fatiar(cubo, competencias=[competencia]), cnes=cnes)
+    assert set(fatia.filtros) == {'COMPETENCIA', 'CNES_KEY'}
+    assert sorted(fatia.cnes()) == sorted(cnes)
+    # Filtro novo sobre o mesmo eixo é a interseção com o anterior
+    assert fatiar(fatiar(cubo, cnes=cnes[:1]), cnes=cnes[1:]).empty
@@ -0,0 +1,68 @@
+"""Casos de borda do numeros_br (leitura e formatação no padrão BR).
+
+Uso:
+    python -m pytest -q test_numeros_br.py
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from numeros_br import formatar_brl, formatar_numeros_br, ler_numeros_br
+
+
+def _formatar_antigo(valor):
+    """O formatar_brl de antes da vetorização, como referência."""
+    if pd.isna(valor): return "R$ 0,00"
+    return "R$ {:,.2f}".format(valor).replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def test_ler_formatos_validos():
+    entrada = ["1.234,56", "1234,56", "-10,5", "R$ 1.300,00", "R$ -5,00", "-R$ 5,00", "0", " 12 ", "1.000.000"]
+    esperado = [1234.56, 1234.56, -10.5, 1300.0, -5.0, -5.0, 0.0, 12.0, 1000000.0]
+    assert ler_numeros_br(pd.Series(entrada)).tolist() == esperado
+
+
+def test_ler_mal_formados_viram_nan():
+    entrada = ["12,3,4", "1.23,00", "abc", "", "1,2.3", "--5", "R$", "1.2345"]
+    assert ler_numeros_br(pd.Series(entrada)).isna().all()
+
+
+def test_ler_vazios():
+    assert ler_numeros_br(pd.Series([None, np.nan], dtype=object)).isna().all()
+    assert ler_numeros_br(pd.Series([], dtype=str)).empty
+
+
+def test_formatar_milhar_sinal_e_prefixo():
+    assert formatar_brl(1234567.891) == "R$ 1.234.567,89"
+    assert formatar_brl(-50) == "R$ -50,00"
+    assert formatar_brl(0) == "R$ 0,00"
+    assert formatar_numeros_br([1234.5], casas=1, milhar=False).tolist() == ["1234,5"]
+
+
+def test_formatar_nan_e_infinito_viram_zero():
+    assert formatar_brl(pd.Series([math.nan, math.inf, -math.inf])).tolist() == ["R$ 0,00"] * 3
+
+
+def test_formatar_arredondado_para_zero_sem_sinal():
+    assert formatar_brl(-0.004) == "R$ 0,00"
+    assert formatar_brl(-0.0) == "R$ 0,00"
+
+
+def test_formatar_meio_termo_igual_ao_antigo():
+    # 0.005 é um pouco maior que o meio-termo em binário; 0.015 e 2.675, um pouco menores
+    valores = [0.005, -0.005, 0.015, 0.125, 0.375, 1.005, 2.675, 1234567.885, 1e15 + 0.5]
+    assert formatar_brl(pd.Series(valores)).tolist() == [_formatar_antigo(v) for v in valores]
+    assert formatar_brl(0.005) == "R$ 0,01"
+
+
+def test_formatar_igual_ao_antigo_em_massa():
+    rng = np.random.default_rng(0)
+    valores = np.concatenate([rng.integers(-10**7, 10**7, 20000) / 1000, rng.normal(0, 1e6, 20000)])
+    antigo = [_formatar_antigo(v).replace("R$ -0,00", "R$ 0,00") for v in valores]
+    assert formatar_brl(valores).tolist() == antigo
+
+
+def test_ida_e_volta():
+    valores = pd.Series([0.01, -1234.56, 987654321.1, 0.0])
+    assert ler_numeros_br(formatar_brl(valores)).tolist() == valores.tolist()
@@ -0,0 +1,89 @@
+"""Competências (AAAAMM) e teto acumulado no período.
+
+Uso:
+    python -m pytest -q test_periodos.py
+"""
+import pandas as pd
+import pytest
+
+from cubo import construir_cubo
+from motor import consolidar_periodo
+from periodos import SEM_COMPETENCIA, competencias_vigentes, normalizar_competencias, rotulo_competencia, teto_do_periodo
+
+
+@pytest.fixture
+def df_teto():
+    # Unidade 1 muda de teto em mar/2025; a unidade 2 só está no primeiro Espelho
+    return pd.DataFrame({
+        'CNES_KEY': ['0000001', '0000001', '0000002'],
+        'Unidade': ['HOSPITAL A', 'HOSPITAL A', 'UBS B'],
+        'COMPETENCIA': ['202501', '202503', '202501'],
+        'Valor_Teto': [100.0, 200.0, 50.0],
+    })
+
+
+@pytest.fixture
+def cubo(df_teto):
+    papa = pd.DataFrame({
+        'CNES_KEY': ['0000001', '0000001', '0000002'],
+        'COMPETENCIA': ['202501', '202502', '202502'],
+        'PA_PROC_ID': ['0301010072'] * 3,
+        'PA_VALAPR': [30.0, 40.0, 5.0],
+    })
+    return construir_cubo(papa, df_teto)
+
+
+def _por_cnes(df):
+    return df.set_index('CNES_KEY')[['Valor_Teto', 'Teto_Mensal']].to_dict('index')
+
+
+def test_normalizar_competencias():
+    entrada = pd.Series(['202501', '2025-02', '03/2025', '202513', 'abc', None], dtype=object)
+    assert normalizar_competencias(entrada).tolist() == ['202501', '202502', '202503', SEM_COMPETENCIA, SEM_COMPETENCIA, SEM_COMPETENCIA]
+
+
+def test_rotulos():
+    assert rotulo_competencia('202501') == 'Jan/2025'
+    assert rotulo_competencia('2025') == '2025'
+    assert rotulo_competencia(SEM_COMPETENCIA) == 'Sem competência'
+
+
+def test_espelho_vigente():
+    # Antes do primeiro Espelho vale o primeiro; depois, o mais recente até a competência
+    assert competencias_vigentes(['202501', '202503'], ['202412', '202502', '202503', '202607']).tolist() == ['202501', '202501', '202503', '202503']
+
+
+def test_teto_acumula_o_vigente_em_cada_mes(df_teto):
+    teto = _por_cnes(teto_do_periodo(df_teto, ['202501', '202502', '202503', '202504']))
+    assert teto['0000001'] == {'Valor_Teto': 100.0 + 100.0 + 200.0 + 200.0, 'Teto_Mensal': 200.0}
+    assert teto['0000002'] == {'Valor_Teto': 50.0 + 50.0, 'Teto_Mensal': 0.0}
+
+
+def test_teto_atravessa_anos(df_teto):
+    competencias = [f"{ano}{mes:02d}" for ano in (2025, 2026) for mes in range(1, 13)]
+    teto = _por_cnes(teto_do_periodo(df_teto, competencias))
+    assert teto['0000001']['Valor_Teto'] == 2 * 100.0 + 22 * 200.0
+
+
+def test_teto_sem_competencias_usa_o_espelho_mais_recente(df_teto):
+    teto = _por_cnes(teto_do_periodo(df_teto))
+    assert teto['0000001'] == {'Valor_Teto': 200.0, 'Teto_Mensal': 200.0}
+
+
+def test_teto_de_periodo_vazio_e_zero(df_teto):
+    teto = teto_do_periodo(df_teto, [])
+    assert set(teto['CNES_KEY']) == {'0000001', '0000002'}
+    assert (teto[['Valor_Teto', 'Teto_Mensal']] == 0).all().all()
+
+
+def test_consolidar_periodo_vazio(cubo, df_teto):
+    df = consolidar_periodo(cubo, df_teto, [])
+    assert not df.empty
+    assert (df[['Valor_Teto', 'Teto_Mensal', 'Valor_Produzido', 'Saldo']] == 0).all().all()
+
+
+def test_consolidar_periodo_acumulado(cubo, df_teto):
+    df = consolidar_periodo(cubo, df_teto, ['202501', '202502']).set_index('CNES_KEY')
+    assert df.loc['0000001', 'Valor_Teto'] == 200.0
+    assert df.loc['0000001', 'Valor_Produzido'] == 70.0
+    assert df.loc['0000002', 'Saldo'] == 100.0 - 5.0
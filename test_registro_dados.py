@@ -0,0 +1,94 @@
+"""Registro de conjuntos: reaproveitamento entre sessões e persistência em disco.
+
+Uso:
+    python -m pytest -q test_registro_dados.py
+"""
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import registro_dados
+from cubo import construir_cubo
+from registro_dados import RegistroDados, id_conjunto, pasta_conjunto
+
+
+@pytest.fixture(autouse=True)
+def dir_cache(tmp_path, monkeypatch):
+    # DIR_CACHE é lido no import: a pasta do teste entra direto no módulo
+    monkeypatch.setattr(registro_dados, 'DIR_CACHE', str(tmp_path))
+    monkeypatch.delenv('SUS_CACHE_DESATIVADO', raising=False)
+    return tmp_path
+
+
+def conjunto():
+    df_teto = pd.DataFrame({'CNES_KEY': ['0000001'], 'Unidade': ['UBS A'], 'COMPETENCIA': ['202501'], 'Valor_Teto': [100.0]})
+    papa = pd.DataFrame({'CNES_KEY': ['0000001'], 'COMPETENCIA': ['202501'], 'PA_PROC_ID': ['0301010072'], 'PA_VALAPR': [30.0]})
+    catalogo = pd.DataFrame({'Procedimento': ['CONSULTA']}, index=pd.Index([301010072], dtype='Int64', name='CODIGO'))
+    return construir_cubo(papa, df_teto), df_teto, catalogo, pd.DataFrame()
+
+
+class Carga:
+    """carregar() que conta as chamadas (e pode demorar, para simular sessões simultâneas)."""
+
+    def __init__(self, espera=0):
+        self.chamadas = 0
+        self.espera = espera
+
+    def __call__(self):
+        self.chamadas += 1
+        time.sleep(self.espera)
+        return conjunto()
+
+
+def test_id_nao_depende_da_ordem():
+    assert id_conjunto(['a', 'b'], ['c']) == id_conjunto(['b', 'a'], ['c']) != id_conjunto(['a'], ['b', 'c'])
+
+
+def test_mesmo_id_processa_uma_vez():
+    registro, carga = RegistroDados(), Carga()
+    primeiro = registro.obter('x', carga)
+    assert registro.obter('x', carga) is primeiro
+    assert carga.chamadas == 1
+
+
+def test_sessoes_simultaneas_esperam_a_primeira_carga():
+    registro, carga = RegistroDados(), Carga(espera=0.2)
+    resultados = []
+    sessoes = [threading.Thread(target=lambda: resultados.append(registro.obter('x', carga))) for _ in range(4)]
+    for s in sessoes: s.start()
+    for s in sessoes: s.join()
+    assert carga.chamadas == 1
+    assert all(r is resultados[0] for r in resultados)
+    assert registro._locks_carga == {}
+
+
+def test_reabre_do_disco_depois_de_reiniciar():
+    carga = Carga()
+    cubo, df_teto, _, _ = RegistroDados().obter('x', carga)
+    assert os.path.exists(os.path.join(pasta_conjunto('x'), 'cubo.parquet'))
+    # Registro novo (servidor reiniciado): não processa de novo, lê o Parquet
+    carga_reiniciado = Carga()
+    cubo_disco, teto_disco, catalogo_disco, _ = RegistroDados().obter('x', carga_reiniciado)
+    assert carga.chamadas == 1 and carga_reiniciado.chamadas == 0
+    pd.testing.assert_frame_equal(cubo_disco.reset_index(drop=True), cubo.reset_index(drop=True), check_dtype=False)
+    pd.testing.assert_frame_equal(teto_disco, df_teto, check_dtype=False)
+    assert catalogo_disco.loc[301010072, 'Procedimento'] == 'CONSULTA'
+
+
+def test_conjunto_gravado_ilegivel_e_processado_de_novo():
+    RegistroDados().obter('x', Carga())
+    with open(os.path.join(pasta_conjunto('x'), 'cubo.parquet'), 'wb') as f:
+        f.write(b'corrompido')
+    carga = Carga()
+    RegistroDados().obter('x', carga)
+    assert carga.chamadas == 1
+
+
+def test_limite_de_conjuntos_em_memoria():
+    registro = RegistroDados(max_conjuntos=2)
+    for id_conj in ('a', 'b', 'a', 'c'):
+        registro.obter(id_conj, Carga())
+    assert registro.resumo()['conjunto'].tolist() == ['a', 'c']